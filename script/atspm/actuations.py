@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+
+from atspm import frames
+
+# =============================================================================
+# signal change during actuation (SCA) and OHG parameters of all detectors in one pass
+# events sorted by (detector, timestamp), detection on/off paired by a state machine
+# that drops orphan on/off events instead of the detector
+# =============================================================================
+
+ohg_cols = ['SCA', 'OccTime', 'HeadwayLead', 'HeadwayFoll', 'GapLead', 'GapFoll']
+
+# detection on/off event ids
+on, off = 82, 81
+
+# next value of an array sorted by runs if in the same run, else nan
+def leadWithin(x, run):
+    lead = np.full(len(x), np.nan)
+    same = run[1:] == run[:-1]
+    lead[:-1][same] = x[1:][same]
+    return lead
+
+# previous value of leading values (nan at the start of each run)
+def follOf(lead):
+    foll = np.full(len(lead), np.nan)
+    foll[1:] = lead[:-1]
+    return foll
+
+# pair detection on/off events sorted by (detector, timestamp) in one pass: a state machine per detector
+# an on opens an actuation and an off closes the open actuation; an on while open orphans the open on
+# (missing off), an off while closed is an orphan (missing on); equivalently, an on is paired with the
+# next event of its detector if that is an off. events before the first on and an on open at the end
+# are outside first on and last off (FOLO), not orphans
+# returns paired on and off events, orphan on and off events
+def pairOnOff(is_on, run):
+    if len(is_on) == 0:
+        none = np.zeros(0, dtype = bool)
+        return {'on': none, 'off': none, 'orphan_on': none, 'orphan_off': none}
+    
+    same_next = np.append(run[1:] == run[:-1], False)
+    same_prev = np.append(False, run[1:] == run[:-1])
+    next_on = np.append(is_on[1:], False)
+    prev_on = np.append(False, is_on[:-1])
+    
+    paired_on = is_on & same_next & ~next_on
+    return {'on': paired_on,
+            'off': np.append(False, paired_on[:-1]),
+            'orphan_on': is_on & same_next & next_on,
+            'orphan_off': ~is_on & same_prev & ~prev_on}
+
+# SCA and OHG parameters of detection-on events of detectors
+# events sorted by timestamp; signal: signal status at each event
+# returns positions of detection-on events, aligned arrays of parameters and orphan (repaired)
+# on/off events of each detector; headways and gaps are left empty across an orphan
+def scaOHG(ts, event_id, param, signal, detectors):
+    ts = np.asarray(ts, dtype = 'int64')
+    event_id = np.asarray(event_id)
+    param = np.asarray(param)
+    signal = np.asarray(signal, dtype = str)
+    
+    # on/off events of detectors, sorted by detector (stable: by timestamp within detector)
+    rows = np.flatnonzero(np.isin(event_id, (on, off)) & np.isin(param, list(detectors)))
+    rows = rows[np.argsort(param[rows], kind = 'stable')]
+    
+    det, t, is_on = param[rows], ts[rows], event_id[rows] == on
+    is_first = np.append(True, det[1:] != det[:-1])[:len(det)] # empty without events
+    run = np.cumsum(is_first) - 1 # detector run of each event
+    num_runs = run[-1] + 1 if len(run) > 0 else 0
+    
+    # pair on/off actuations, dropping orphans
+    pair = pairOnOff(is_on, run)
+    on_rows, off_rows = pair['on'], pair['off']
+    on_time, off_time = t[on_rows], t[off_rows]
+    
+    # headways and gaps to next actuation over the same detector, within segments between orphans
+    segment = np.cumsum(is_first | pair['orphan_on'] | pair['orphan_off'])[on_rows]
+    HeadwayLead = leadWithin(on_time, segment) - on_time
+    GapLead = leadWithin(on_time, segment) - off_time
+    
+    return {'index': rows[on_rows],
+            'SCA': np.char.add(signal[rows[on_rows]], signal[rows[off_rows]]),
+            'OccTime': (off_time - on_time) / 1000,
+            'HeadwayLead': HeadwayLead / 1000,
+            'HeadwayFoll': follOf(HeadwayLead) / 1000,
+            'GapLead': GapLead / 1000,
+            'GapFoll': follOf(GapLead) / 1000,
+            'repairs': {'Parameter': det[is_first],
+                        'OrphanOn': np.bincount(run[pair['orphan_on']], minlength = num_runs),
+                        'OrphanOff': np.bincount(run[pair['orphan_off']], minlength = num_runs)}}
+
+# full-length columns of parameters over n events: nan except at detection-on events
+def toColumns(sca_ohg, n):
+    columns = {}
+    for col in ohg_cols:
+        values = np.full(n, np.nan, dtype = object if col == 'SCA' else 'float64')
+        values[sca_ohg['index']] = sca_ohg[col]
+        columns[col] = values
+    return columns
+
+# =============================================================================
+# compact schema of processed actuations: integer and categorical codes, float parameters
+# labels (e.g. detector numbers as strings for plotting) only at presentation
+# =============================================================================
+
+det_types = ['adv', 'stop', 'front', 'rear']
+
+# signal change during actuation: signal at detection on x signal at detection off
+signals = ['Y', 'R', 'G']
+sca_types = [s_on + s_off for s_on in signals for s_off in signals]
+
+schema = {'TimeStamp': 'int64', # epoch milliseconds
+          'Parameter': 'uint8', # detector number
+          'Lane': 'int8', # lane position, -1 for left-turn lane
+          'Det': pd.CategoricalDtype(det_types),
+          'CycleNum': 'float64', # cycle and OHG parameters: nan if unknown
+          'AIY': 'float64',
+          'TUY': 'float64',
+          'TUG': 'float64',
+          'SCA': pd.CategoricalDtype(sca_types),
+          'OccTime': 'float64',
+          'HeadwayLead': 'float64',
+          'HeadwayFoll': 'float64',
+          'GapLead': 'float64',
+          'GapFoll': 'float64',
+          'ID': 'int64'}
+
+# cast columns of processed actuations to schema, columns already of schema type are kept
+# untyped columns (e.g. of empty frames) are typed, so compacted frames can be written (see atspm/frames.py)
+def compact(df):
+    dtypes = {col: dtype for col, dtype in schema.items() if col in df.columns and df[col].dtype != dtype}
+    return df.astype(dtypes) if len(dtypes) > 0 else df
+
+# read processed actuations (e.g. _filtered.npz, see atspm/frames.py) with schema
+def readActuations(file):
+    return compact(frames.readFrame(file))
+
+# labels of coded columns for presentation: detector numbers and lanes as strings, categories as objects
+def labels(df):
+    cols = {col: df[col].astype(str) for col in ['Parameter', 'Lane'] if col in df.columns}
+    cols.update({col: df[col].astype(object) for col in ['Det', 'SCA'] if col in df.columns})
+    return df.assign(**cols)
@@ -0,0 +1,108 @@
+import os
+import numpy as np
+import pandas as pd
+
+from atspm.timestamps import parseTimeStamp, toEpoch
+
+# =============================================================================
+# compact event arrays: one 12-byte record per event, sorted by device, timestamp
+# sharded by device: <path>/device=<id>.npy
+# =============================================================================
+
+event_dtype = np.dtype([('ts', '<i8'), # epoch milliseconds
+                        ('event', 'u1'),
+                        ('param', 'u1'),
+                        ('device', '<u2')])
+
+# pack typed columns into compact records
+def pack(data, device):
+    events = np.empty(len(data['TimeStamp']), dtype = event_dtype)
+    events['ts'] = data['TimeStamp']
+    events['event'] = data['EventID']
+    events['param'] = data['Parameter']
+    events['device'] = device
+    return events
+
+# path of a device shard of compact records
+def shardPath(path, device):
+    return os.path.join(path, 'device=' + str(device) + '.npy')
+
+# sort staged records by device, timestamp into a .npy file
+# only the sort keys are held in memory
+def sortStaged(temp_path, path, block = 1000000):
+    staged = np.memmap(temp_path, dtype = event_dtype, mode = 'r')
+    order = np.lexsort((staged['ts'], staged['device']))
+    
+    out = np.lib.format.open_memmap(path, mode = 'w+', dtype = event_dtype, shape = (len(order),))
+    for i in range(0, len(order), block):
+        out[i:i + block] = staged[order[i:i + block]]
+    out.flush()
+    
+    del staged, out
+    os.remove(temp_path)
+    return len(order)
+
+# write chunks of compact records to a .npy file sorted by device, timestamp
+def writeEvents(path, chunks):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        for events in chunks:
+            events.astype(event_dtype, copy = False).tofile(f)
+    
+    return sortStaged(temp_path, path)
+
+# convert tab-separated month file (TimeStamp, EventID, Parameter, DeviceID) to device shards
+# staged records of an interrupted run are removed first, as records are appended to them
+def fromText(txt_file, path, fmt = '%m-%d-%Y %H:%M:%S.%f', chunksize = 1000000):
+    os.makedirs(path, exist_ok = True)
+    for file in os.listdir(path):
+        if file.endswith('.npy.tmp'):
+            os.remove(os.path.join(path, file))
+    devices = set()
+    
+    for chunk in pd.read_csv(txt_file, sep = '\t', chunksize = chunksize):
+        data = {'TimeStamp': parseTimeStamp(chunk.TimeStamp, fmt),
+                'EventID': chunk.EventID.values,
+                'Parameter': chunk.Parameter.values}
+        events = pack(data, chunk.DeviceID.values)
+        
+        # stage records of each device shard
+        for device in np.unique(events['device']):
+            with open(shardPath(path, device) + '.tmp', 'ab') as f:
+                events[events['device'] == device].tofile(f)
+            devices.add(int(device))
+    
+    return {device: sortStaged(shardPath(path, device) + '.tmp', shardPath(path, device)) for device in sorted(devices)}
+
+# =============================================================================
+# mmap-backed reader
+# =============================================================================
+
+def openEvents(path):
+    return np.load(path, mmap_mode = 'r')
+
+# open only the shard of a device
+def openShard(path, device):
+    return openEvents(shardPath(path, device))
+
+# zero-copy view of events of a device within [start, end] by binary search
+def sliceEvents(events, device = None, start = None, end = None):
+    if device is not None:
+        lo = np.searchsorted(events['device'], device, side = 'left')
+        hi = np.searchsorted(events['device'], device, side = 'right')
+        events = events[lo:hi]
+    
+    if start is not None or end is not None:
+        # timestamps are sorted only within a device
+        lo = 0 if start is None else np.searchsorted(events['ts'], toEpoch(start), side = 'left')
+        hi = len(events) if end is None else np.searchsorted(events['ts'], toEpoch(end), side = 'right')
+        events = events[lo:hi]
+    
+    return events
+
+# data frame of a slice of events (copies only the slice)
+def toFrame(events):
+    return pd.DataFrame({'TimeStamp': np.asarray(events['ts']),
+                         'EventID': np.asarray(events['event']),
+                         'Parameter': np.asarray(events['param']),
+                         'DeviceID': np.asarray(events['device'])})
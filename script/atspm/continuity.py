@@ -0,0 +1,201 @@
+import os
+import numpy as np
+import pandas as pd
+
+from atspm import store, query, manifest
+from atspm.timestamps import ms_hour
+
+# =============================================================================
+# data continuity index: event counts, gaps, on/off balance, phase sequence per hour
+# =============================================================================
+
+# phase change and detector events
+phase_events = (1, 7, 8, 9, 10, 11)
+phase_start = {1: 'G', 8: 'Y', 10: 'R'}
+phase_order = {('G', 'Y'), ('Y', 'R'), ('R', 'G')} # valid start-to-start transitions
+on, off = 82, 81
+
+# thresholds to flag a partition
+max_gap_phase = 300 # max seconds without phase events
+max_repeat_share = 0.05 # max share of repeated on-on or off-off states of a detector (orphans dropped in pairing, see atspm/actuations.py)
+max_seq_errors = 0 # max invalid transitions in phase sequence
+
+# hours excluded by hand: errors in data continuity found on plots of events (see preprocess_data.py)
+# temporary: flagged in addition to the checks below until the checks are shown to flag them too
+# (preprocess_data.py reports hours excluded by hand that the checks do not flag); then to be removed
+def excludeHour(date, hour):
+    month, day = int(date[4:6]), int(date[6:8])
+    
+    c1 = (hour == 2)
+    c2 = ((month == 1) & (day == 1) & (hour == 13))
+    c3 = ((month == 2) & (day == 17) & (hour == 11))
+    c4 = ((month == 2) & (day == 21) & (hour == 6))
+    
+    return (c1 | c2 | c3 | c4)
+
+index_cols = ['device', 'date', 'hour', 'checksum', 'type', 'channel', 'events', 'on', 'off',
+              'imbalance', 'folo_imbalance', 'repeats', 'max_gap', 'seq_errors']
+count_cols = ['events', 'on', 'off', 'imbalance', 'folo_imbalance', 'repeats', 'seq_errors']
+
+# =============================================================================
+# metrics of channels of many partitions at once: events of partitions in one frame,
+# numbered by column 'part', grouped by (part, channel)
+# =============================================================================
+
+# max gap (s) between sorted timestamps of each channel, including partition bounds
+# start, end: bounds of each partition (epoch milliseconds)
+def maxGap(xdf, start, end):
+    keys = [xdf.part, xdf.Parameter]
+    ts = xdf.groupby(keys).TimeStamp
+    inner = (xdf.TimeStamp - ts.shift()).groupby(keys).max()
+    first, last = ts.min(), ts.max()
+    part = first.index.get_level_values('part').values
+    return pd.concat([inner, first - start[part], end[part] - last], axis = 1).max(axis = 1) / 1000
+
+# metrics of detector channels
+def detectorMetrics(ddf, start, end):
+    ddf = ddf.sort_values(['part', 'Parameter', 'TimeStamp'], kind = 'stable')
+    keys = [ddf.part, ddf.Parameter]
+    grp = ddf.groupby(keys)
+    
+    is_on = ddf.EventID == on
+    is_off = ddf.EventID == off
+    
+    # on/off count between first on and last off (first on, last off window)
+    first_on = ddf.TimeStamp.where(is_on).groupby(keys).transform('min')
+    last_off = ddf.TimeStamp.where(is_off).groupby(keys).transform('max')
+    window = (ddf.TimeStamp >= first_on) & (ddf.TimeStamp <= last_off)
+    
+    # repeated on-on or off-off states
+    repeats = (ddf.EventID == grp.EventID.shift()).groupby(keys).sum()
+    
+    mdf = pd.DataFrame({'events': grp.size(),
+                        'on': is_on.groupby(keys).sum(),
+                        'off': is_off.groupby(keys).sum(),
+                        'folo_imbalance': (is_on & window).groupby(keys).sum() - (is_off & window).groupby(keys).sum(),
+                        'repeats': repeats,
+                        'max_gap': maxGap(ddf[is_on], start, end)})
+    mdf['imbalance'] = mdf.on - mdf.off
+    mdf['seq_errors'] = 0
+    return mdf
+
+# valid transitions as concatenated states, e.g. 'GY'
+transitions = [p + s for p, s in phase_order]
+
+# metrics of phase channels
+def phaseMetrics(pdf, start, end):
+    pdf = pdf.sort_values(['part', 'Parameter', 'TimeStamp'], kind = 'stable')
+    keys = [pdf.part, pdf.Parameter]
+    grp = pdf.groupby(keys)
+    
+    # invalid transitions between consecutive indication starts
+    sdf = pdf[pdf.EventID.isin(phase_start.keys())]
+    state = sdf.EventID.map(phase_start)
+    prev = state.groupby([sdf.part, sdf.Parameter]).shift()
+    seq_errors = (prev.notna() & ~(prev + state).isin(transitions)).groupby([sdf.part, sdf.Parameter]).sum()
+    
+    mdf = pd.DataFrame({'events': grp.size(),
+                        'max_gap': maxGap(pdf, start, end),
+                        'seq_errors': seq_errors})
+    mdf['seq_errors'] = mdf.seq_errors.fillna(0)
+    for col in ['on', 'off', 'imbalance', 'folo_imbalance', 'repeats']:
+        mdf[col] = 0
+    return mdf
+
+# metrics of hour partitions [(date, hour)] of a device with their checksums, one row per partition and channel
+def partitionMetrics(store_path, device, partitions, phases, detectors, checksums):
+    if len(partitions) == 0:
+        return pd.DataFrame(columns = index_cols)
+    
+    start = np.array([store.partitionStart(date, hour) for date, hour in partitions], dtype = 'int64')
+    end = start + ms_hour
+    
+    result = []
+    for xtype, event_ids, channels, func in [('phase', phase_events, phases, phaseMetrics),
+                                             ('det', (on, off), detectors, detectorMetrics)]:
+        xdf = pd.concat([query.frame(query.hourEvents(store_path, device, date, hour, event_ids = event_ids, params = channels)).assign(part = i)
+                         for i, (date, hour) in enumerate(partitions)], ignore_index = True)
+        keys = pd.MultiIndex.from_product([range(len(partitions)), channels], names = ['part', 'Parameter'])
+        mdf = func(xdf, start, end).reindex(keys) if len(xdf) > 0 else pd.DataFrame(index = keys, columns = count_cols + ['max_gap'], dtype = 'float64')
+        
+        # channels without events in partition
+        missing = mdf.events.isna()
+        mdf.loc[missing, 'max_gap'] = ms_hour / 1000
+        mdf = mdf.fillna(0).astype({col: 'int64' for col in count_cols})
+        
+        mdf['type'] = xtype
+        mdf['part'], mdf['channel'] = keys.get_level_values('part'), keys.get_level_values('Parameter')
+        result.append(mdf.reset_index(drop = True))
+    
+    # rows of each partition: phase channels, then detector channels
+    mdf = pd.concat(result, ignore_index = True).sort_values('part', kind = 'stable')
+    part = mdf.part.values
+    mdf['device'] = device
+    mdf['date'] = [partitions[i][0] for i in part]
+    mdf['hour'] = [partitions[i][1] for i in part]
+    mdf['checksum'] = [checksums[i] for i in part]
+    return mdf[index_cols].reset_index(drop = True)
+
+# =============================================================================
+# build, persist and query the index
+# =============================================================================
+
+def indexPath(store_path, device):
+    return os.path.join(store_path, 'device=' + str(device), '_continuity.txt')
+
+# metrics are recomputed only for partitions whose checksum or channels changed since the last build
+# changed partitions are read and computed at once
+def buildIndex(store_path, device, phases, detectors):
+    files = manifest.readManifest(store_path)
+    channels = sorted([('phase', ch) for ch in phases] + [('det', ch) for ch in detectors])
+    
+    previous = {}
+    if os.path.exists(indexPath(store_path, device)):
+        for key, mdf in readIndex(store_path, device).groupby(['date', 'hour']):
+            previous[key] = mdf
+    
+    # partitions without current metrics
+    partitions = store.listPartitions(store_path, device)
+    stale, checksums = [], []
+    for date, hour, path in partitions:
+        checksum = manifest.partitionChecksumOf(files, store_path, path)
+        mdf = previous.get((date, hour))
+        
+        if mdf is None or 'checksum' not in mdf or (mdf.checksum != checksum).any() or sorted(zip(mdf.type, mdf.channel)) != channels:
+            stale.append((date, hour))
+            checksums.append(checksum)
+    
+    fresh = partitionMetrics(store_path, device, stale, phases, detectors, checksums)
+    previous.update({key: mdf for key, mdf in fresh.groupby(['date', 'hour'])})
+    
+    index = pd.concat([previous[(date, hour)] for date, hour, path in partitions], ignore_index = True) if len(partitions) > 0 else fresh
+    index.to_csv(indexPath(store_path, device), sep = '\t', index = False)
+    return index
+
+def readIndex(store_path, device):
+    return pd.read_csv(indexPath(store_path, device), sep = '\t', dtype = {'date': str, 'checksum': str}, keep_default_na = False)
+
+# flag hours failing continuity checks: (date, hour) -> True if bad
+# channels can be restricted to phases and detectors, e.g. of one approach
+# silent: detectors without events in an hour as normal, e.g. left-turn rear det when nobody turns left
+# by_hand: hours excluded by hand are flagged too (temporary, see excludeHour)
+def flagPartitions(index, phases = None, detectors = None, silent = None, by_hand = True):
+    if phases is not None:
+        index = index[(index.type != 'phase') | index.channel.isin(phases)]
+    if detectors is not None:
+        index = index[(index.type != 'det') | index.channel.isin(detectors)]
+    
+    no_events = (index.events == 0) & ~((index.type == 'det') & index.channel.isin([] if silent is None else list(silent)))
+    bad = ((index.type == 'phase') & (no_events | (index.max_gap > max_gap_phase) | (index.seq_errors > max_seq_errors))) | \
+          ((index.type == 'det') & (no_events | (index.repeats > max_repeat_share * index.events)))
+    flags = bad.groupby([index.date, index.hour]).any()
+    
+    if by_hand:
+        flags = flags | pd.Series([excludeHour(date, hour) for date, hour in flags.index], index = flags.index, dtype = bool)
+    return flags
+
+# partitions passing continuity checks: [(date, hour, path)]
+def goodPartitions(store_path, device, index, phases = None, detectors = None, silent = None):
+    flags = flagPartitions(index, phases, detectors, silent)
+    return [(date, hour, path) for date, hour, path in store.listPartitions(store_path, device)
+            if not flags.get((date, hour), True)]
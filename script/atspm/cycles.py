@@ -0,0 +1,158 @@
+import os
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+
+from atspm import store, query, intervals
+
+# =============================================================================
+# cycle table of a phase: cycles start on yellow
+# computed once per device/phase/partition, memoized in-process for the last
+# partitions and persisted next to the partition as <partition>/_cycles/phase=<p>.npz
+# =============================================================================
+
+# phase change events (s = start, e = end)
+pse = {'Gs': 1, 'Ge': 7,
+       'Ys': 8, 'Ye': 9,
+       'Rs': 10, 'Re': 11}
+start_events = (pse['Ys'], pse['Rs'], pse['Gs'])
+
+cycle_cols = ['CycleNum', 'CycleLength', 'YST', 'RST', 'GST', 'YST_NC', 'YellowTime', 'RedTime', 'GreenTime']
+
+# cycle tables of the last partitions read or computed in this process: {(path, phase): table}
+# least recently used tables are dropped; they are read back from _cycles if needed again
+cache = OrderedDict()
+cache_size = 8
+
+def cyclePath(path, phase):
+    return os.path.join(path, '_cycles', 'phase=' + str(phase) + '.npz')
+
+# indication start times of phase events within cycle range: yellow, red, green
+def startTimes(pdf):
+    return {'Y': tuple((pdf.loc[pdf.EventID == pse['Ys']]).TimeStamp),
+            'R': tuple((pdf.loc[pdf.EventID == pse['Rs']]).TimeStamp),
+            'G': tuple((pdf.loc[pdf.EventID == pse['Gs']]).TimeStamp)}
+
+# cycle data frame from indication start times of complete cycles: Y[0] < R[0] < G[0] < Y[1] ... < Y[n]
+def cycleFrame(start_time):
+    # indication time intervals (yellow, red, green) and cycle length
+    interval = intervals.cycleIntervals(start_time)
+    Y, R, G = (np.asarray(start_time[s], dtype = 'int64') for s in ('Y', 'R', 'G'))
+    
+    cycle = {
+        'CycleNum': np.arange(1, max(len(Y), 1), dtype = 'int64'),
+        'CycleLength': interval['length'],
+        'YST': Y[:-1], # current cycle
+        'RST': R,
+        'GST': G,
+        'YST_NC': Y[1:], # next cycle
+        'YellowTime': interval['Y'],
+        'RedTime': interval['R'],
+        'GreenTime': interval['G']
+    }
+    
+    return pd.DataFrame(cycle)
+
+# cycle table of phase change events of one phase, sorted by timestamp
+# returns cycle data frame, cycle time range and indication start events within range
+# without green end events the table is empty, with empty cycle range (0, 0)
+def fromEvents(pdf):
+    # compute cycle time range assuming cycle starts on yellow
+    green_end = pdf.loc[pdf.EventID == pse['Ge']].TimeStamp
+    cycle_range = {'min': green_end.min() if len(green_end) > 0 else 0,
+                   'max': green_end.max() if len(green_end) > 0 else 0}
+    
+    pdf = query.window(pdf, cycle_range['min'], cycle_range['max'])
+    pdf = pdf[pdf.EventID.isin(start_events)]
+    start_time = startTimes(pdf)
+    
+    return {'cdf': cycleFrame(start_time), # cycle data frame
+            'cycle_range': cycle_range,
+            'pdf': pdf, # phase data frame
+            'start_time': start_time}
+
+# =============================================================================
+# persisted cycle tables of partitions
+# =============================================================================
+
+def writeCycles(path, phase, table):
+    file = cyclePath(path, phase)
+    os.makedirs(os.path.dirname(file), exist_ok = True)
+    
+    cycle_range = np.array([table['cycle_range']['min'], table['cycle_range']['max']], dtype = 'int64')
+    np.savez(file, cycle_range = cycle_range, **{col: table['cdf'][col].values for col in cycle_cols})
+    return None
+
+def readCycles(path, phase):
+    with np.load(cyclePath(path, phase)) as data:
+        cdf = pd.DataFrame({col: data[col] for col in cycle_cols})
+        cycle_range = {'min': data['cycle_range'][0], 'max': data['cycle_range'][1]}
+    
+    return {'cdf': cdf, 'cycle_range': cycle_range}
+
+# phase change events of a phase from events already read, or from the store
+def phaseEvents(path, phase, event_ids, start = None, end = None, edf = None):
+    if edf is None:
+        return store.readEvents(path, start = start, end = end, event_ids = event_ids, params = [phase])
+    return query.window(edf[(edf.Parameter == phase) & edf.EventID.isin(list(event_ids))], start, end)
+
+# cycle table of a partition: memoized, else read from disk, else computed from phase events and persisted
+# indication start events are read back within the cycle range, from edf if the partition's events were read
+# tables are shared between callers and must not be modified
+def cycleTable(path, phase, edf = None):
+    key = (os.path.abspath(path), phase)
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    
+    if os.path.exists(cyclePath(path, phase)):
+        table = readCycles(path, phase)
+        cycle_range = table['cycle_range']
+        table['pdf'] = phaseEvents(path, phase, start_events, cycle_range['min'], cycle_range['max'], edf)
+        table['start_time'] = startTimes(table['pdf'])
+    else:
+        table = fromEvents(phaseEvents(path, phase, pse.values(), edf = edf))
+        writeCycles(path, phase, table)
+    
+    cache[key] = table
+    while len(cache) > cache_size:
+        cache.popitem(last = False)
+    return table
+
+# =============================================================================
+# as-of lookup of timestamps in a cycle table
+# =============================================================================
+
+# signal indication of start events
+signal = {pse['Ys']: 'Y', pse['Rs']: 'R', pse['Gs']: 'G'}
+
+# signal indication and cycle parameters at timestamps by binary search on sorted start times, O(n log c)
+# an indication is in effect from its start event on (start events first on ties)
+# a cycle runs from its yellow start to the yellow start of the next cycle
+# values at positions i where valid, else nan; all nan if there are no values (empty table)
+def lookup(values, i, valid):
+    if len(values) == 0:
+        return np.full(len(i), np.nan)
+    return np.where(valid, values[np.maximum(i, 0)], np.nan)
+
+# returns cycle number (nan outside cycles), signal (nan before first start event), AIY, TUY, TUG (s)
+def asOf(table, ts):
+    ts = np.asarray(ts, dtype = 'int64')
+    pdf, cdf = table['pdf'], table['cdf']
+    
+    # latest indication start at or before each timestamp
+    k = np.searchsorted(pdf.TimeStamp.values, ts, side = 'right') - 1
+    Signal = lookup(pdf.EventID.map(signal).values, k, k >= 0)
+    
+    # latest cycle start at or before each timestamp, within end of cycle
+    c = np.searchsorted(cdf.YST.values, ts, side = 'right') - 1
+    inside = (c >= 0) & (ts < lookup(cdf.YST_NC.values, c, c >= 0))
+    
+    def cycleValues(col):
+        return lookup(cdf[col].values, c, inside)
+    
+    return {'Signal': Signal,
+            'CycleNum': cycleValues('CycleNum'),
+            'AIY': np.round((ts - cycleValues('YST')) / 1000, 1), # arrival in yellow
+            'TUY': np.round((cycleValues('YST_NC') - ts) / 1000, 1), # time until yellow
+            'TUG': np.round((cycleValues('GST') - ts) / 1000, 1)} # time until green
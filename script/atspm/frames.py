@@ -0,0 +1,55 @@
+import json
+import zipfile
+import numpy as np
+import pandas as pd
+
+# =============================================================================
+# typed binary frames: columns of a data frame as one record array in a .npz file
+# with a json header of schema version, columns and categories of categorical columns
+# categorical columns are stored as codes; no parsing of values on read
+# schema version: layout of frame files, bumped on incompatible changes
+# =============================================================================
+
+schema_version = 1
+
+# write columns of a data frame (index is not written)
+# zip entries have a fixed time, so equal frames have equal file checksums (see atspm/manifest.py)
+def writeFrame(file, df):
+    header = {'version': schema_version, 'columns': [str(col) for col in df.columns], 'categories': {}}
+    
+    columns = []
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            header['categories'][str(col)] = [str(cat) for cat in df[col].cat.categories]
+            columns.append(df[col].cat.codes.values)
+        elif df[col].dtype == object:
+            raise ValueError("Untyped column in frame: " + str(col))
+        else:
+            columns.append(df[col].values)
+    
+    data = np.empty(len(df), dtype = [(col, values.dtype) for col, values in zip(header['columns'], columns)])
+    for col, values in zip(header['columns'], columns):
+        data[col] = values
+    
+    arrays = {'header': np.array(json.dumps(header)), 'data': data}
+    with zipfile.ZipFile(file, 'w') as zf:
+        for key, values in arrays.items():
+            with zf.open(zipfile.ZipInfo(key + '.npy'), 'w', force_zip64 = True) as f:
+                np.lib.format.write_array(f, values, allow_pickle = False)
+    return None
+
+def readFrame(file):
+    with np.load(file) as npz:
+        header = json.loads(str(npz['header']))
+        if header['version'] != schema_version:
+            raise ValueError("Unsupported frame schema version: " + str(header['version']) + " in " + str(file))
+        data = npz['data']
+    
+    cols = {}
+    for col in header['columns']:
+        if col in header['categories']:
+            cols[col] = pd.Categorical.from_codes(data[col], dtype = pd.CategoricalDtype(header['categories'][col]))
+        else:
+            cols[col] = data[col]
+    
+    return pd.DataFrame(cols)
@@ -0,0 +1,153 @@
+import os
+import shutil
+import zipfile
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from atspm import store, compact, manifest
+from atspm.timestamps import parseTimeStamp
+
+# columns of raw controller event logs
+raw_cols = ['TimeStamp', 'EventID', 'Parameter']
+raw_dtype = {'TimeStamp': str, 'EventID': 'uint8', 'Parameter': 'uint8'}
+
+# =============================================================================
+# stream one zip file in bounded chunks of typed columns
+# =============================================================================
+
+def readZip(zip_file, chunksize = 500000):
+    with zipfile.ZipFile(zip_file) as zf:
+        for member in zf.namelist():
+            reader = pd.read_csv(zf.open(member), names = raw_cols, dtype = raw_dtype, chunksize = chunksize)
+            
+            for chunk in reader:
+                yield {'TimeStamp': parseTimeStamp(chunk.TimeStamp),
+                       'EventID': chunk.EventID.values,
+                       'Parameter': chunk.Parameter.values}
+
+# manifest key of a zip file (normalized path)
+def zipKey(zip_file):
+    return os.path.normpath(zip_file).replace(os.sep, '/')
+
+# ingest one zip file into hour partitions, only into partitions of only (if given)
+# returns partitions written, rows and time range of zip file
+def ingestZip(zip_file, device, store_path, chunksize = 500000, only = None):
+    source = os.path.splitext(os.path.basename(zip_file))[0]
+    summary = {'paths': set(), 'rows': 0, 'start': -1, 'end': -1}
+    
+    for data in readZip(zip_file, chunksize):
+        ts = data['TimeStamp']
+        if len(ts) > 0:
+            summary['start'] = int(ts.min()) if summary['rows'] == 0 else min(summary['start'], int(ts.min()))
+            summary['end'] = max(summary['end'], int(ts.max()))
+            summary['rows'] += len(ts)
+        
+        # split chunk into hour partitions
+        for (date, hour), part in store.splitHours(data).items():
+            path = store.partitionPath(store_path, device, date, hour)
+            if only is not None and path not in only:
+                continue
+            store.appendPart(path, source, part)
+            summary['paths'].add(path)
+    
+    return summary
+
+# =============================================================================
+# ingest zip files sharded by device: one worker per device shard
+# =============================================================================
+
+# group zip files by device: {device: [zip_file]}
+def groupDevices(zip_files, devices):
+    shards = {}
+    for zip_file, device in zip(zip_files, devices):
+        shards.setdefault(device, []).append(zip_file)
+    return shards
+
+# ingest and finalize partitions of one device
+# jobs: {zip_file: partitions to rebuild, or None for all partitions of zip file}
+def ingestShard(device, jobs, store_path, chunksize = 500000):
+    zips, sources = {}, {}
+    for zip_file, only in jobs.items():
+        summary = ingestZip(zip_file, device, store_path, chunksize, only)
+        for path in summary.pop('paths'):
+            sources.setdefault(path, set()).add(zip_file)
+        zips[zip_file] = summary
+    
+    rows = {path: store.finalizePartition(path) for path in sorted(sources)}
+    return {'zips': zips, 'sources': sources, 'rows': rows}
+
+# ingest new or changed zip files into store, recorded in manifest of store
+# partitions derived from a changed zip file are rebuilt from all of their zip files
+def ingestZipFiles(zip_files, devices, store_path, num_workers = 4, chunksize = 500000):
+    files = manifest.readManifest(store_path)
+    zip_files = [zipKey(zip_file) for zip_file in zip_files]
+    
+    # checksums of zip files, hashed only if size or modification time changed
+    checksum = manifest.checksums(files, 'zip')
+    current = {zip_file: manifest.fileChecksumOf(files, zip_file, zip_file) for zip_file in zip_files}
+    changed = [zip_file for zip_file in zip_files if checksum.get(zip_file) != current[zip_file]]
+    checksum.update(current)
+    
+    # jobs of each device: {zip_file: None} ingests all partitions of new or changed zip files
+    jobs = {}
+    for zip_file, device in zip(zip_files, devices):
+        if zip_file in changed:
+            jobs.setdefault(device, {})[zip_file] = None
+    
+    # stale partitions: an upstream zip file changed since the partition was written
+    stale = {}
+    for key, entry in files[files.kind == 'partition'].iterrows():
+        inputs = manifest.upstreamKeys(entry.upstream)
+        if any(zip_file in changed for zip_file in inputs):
+            stale[key] = inputs
+    
+    # rebuild stale partitions from all of their zip files: {zip_file: {path}}
+    for key, inputs in stale.items():
+        path = os.path.join(store_path, key)
+        shutil.rmtree(path, ignore_errors = True)
+        
+        device = int(key.split('/')[0][len('device='):])
+        for zip_file in inputs:
+            only = jobs.setdefault(device, {}).setdefault(zip_file, set())
+            if only is not None:
+                only.add(path)
+    files = manifest.drop(files, stale.keys())
+    
+    print("Zip files new or changed: ", len(changed), ", partitions to rebuild: ", len(stale))
+    
+    with ProcessPoolExecutor(max_workers = num_workers) as pool:
+        n = len(jobs)
+        results = list(pool.map(ingestShard, jobs.keys(), jobs.values(), [store_path]*n, [chunksize]*n))
+    
+    # record changed zip files, then partitions with checksums of their zip files
+    rows = {}
+    for result in results:
+        for zip_file, summary in result['zips'].items():
+            if zip_file in changed:
+                files = manifest.record(files, zip_file, 'zip', current[zip_file], summary['rows'],
+                                        summary['start'], summary['end'], stat = manifest.fileStat(zip_file))
+        
+        for path, inputs in result['sources'].items():
+            key = manifest.partitionKey(store_path, path)
+            if key in files.index:
+                inputs = inputs | set(manifest.upstreamKeys(files.loc[key, 'upstream']))
+            files = manifest.recordPartition(files, store_path, path, manifest.upstreamOf({k: checksum[k] for k in inputs}))
+        
+        rows.update(result['rows'])
+    
+    manifest.writeManifest(store_path, files)
+    return rows
+
+# write compact records of one device shard
+def compactShard(device, zip_files, path, chunksize = 500000):
+    chunks = (compact.pack(data, device) for zip_file in zip_files for data in readZip(zip_file, chunksize))
+    return compact.writeEvents(compact.shardPath(path, device), chunks)
+
+def compactZipFiles(zip_files, devices, path, num_workers = 4, chunksize = 500000):
+    os.makedirs(path, exist_ok = True)
+    shards = groupDevices(zip_files, devices)
+    
+    with ProcessPoolExecutor(max_workers = num_workers) as pool:
+        n = len(shards)
+        rows = pool.map(compactShard, shards.keys(), shards.values(), [path]*n, [chunksize]*n)
+        return dict(zip(shards.keys(), rows))
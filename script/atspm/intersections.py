@@ -0,0 +1,33 @@
+import json
+
+# =============================================================================
+# intersection configuration: approaches of each device with phases, detectors, lane positions
+# {device: {'name', 'approaches': {approach: {'phase': {'thru', 'left'},
+#                                             'det': {'adv', 'stop', 'front', 'rear'},
+#                                             'lane': {'adv': {det: lane}, 'stop': {det: lane}}}}}}
+# lanes are numbered from the right (0) within an approach
+# =============================================================================
+
+# approach configuration with json lists and keys as detector tuples and numbers
+def parseApproach(approach):
+    det = {key: tuple(value) if isinstance(value, list) else value for key, value in approach['det'].items()}
+    lane = {key: {int(ch): pos for ch, pos in value.items()} for key, value in approach['lane'].items()}
+    return {'phase': dict(approach['phase']), 'det': det, 'lane': lane}
+
+def readConfig(file):
+    with open(file) as f:
+        config = json.load(f)
+    return {int(device): {'name': value.get('name', ''),
+                          'approaches': {key: parseApproach(approach) for key, approach in value['approaches'].items()}}
+            for device, value in config.items()}
+
+# configurations of approaches of a device: {approach: config}
+def approaches(file, device):
+    return readConfig(file)[int(device)]['approaches']
+
+# phases and detectors of approaches, e.g. channels of a continuity index
+def thruPhases(configs):
+    return sorted({config['phase']['thru'] for config in configs.values()})
+
+def detectors(configs):
+    return sorted({ch for config in configs.values() for ch in config['det']['adv'] + config['det']['stop'] + (config['det']['rear'],)})
@@ -0,0 +1,25 @@
+import numpy as np
+
+# =============================================================================
+# time intervals (s) between int64 epoch-millisecond timestamps, in bulk
+# =============================================================================
+
+# seconds from earlier to later timestamps, elementwise over their common length
+def seconds(later, earlier):
+    later = np.asarray(later, dtype = 'int64')
+    earlier = np.asarray(earlier, dtype = 'int64')
+    n = min(len(later), len(earlier))
+    return (later[:n] - earlier[:n]) / 1000
+
+# =============================================================================
+# cycle intervals
+# =============================================================================
+
+# indication intervals and cycle length from start times of yellow, red, green
+# cycles start on yellow: Y[i] < R[i] < G[i] < Y[i+1]
+def cycleIntervals(start_time):
+    Y, R, G = (np.asarray(start_time[s], dtype = 'int64') for s in ('Y', 'R', 'G'))
+    return {'Y': seconds(R, Y[:-1]),
+            'R': seconds(G, R),
+            'G': seconds(Y[1:], G),
+            'length': seconds(Y[1:], Y[:-1])}
@@ -0,0 +1,121 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+from atspm import store
+
+# =============================================================================
+# content-hash manifest: checksum, row count, time range of inputs and artifacts
+# upstream: 'key@checksum' of each input an artifact was derived from
+# stat: 'size:mtime' of input files, to skip hashing unchanged files
+# =============================================================================
+
+manifest_cols = ['key', 'kind', 'checksum', 'rows', 'start', 'end', 'upstream', 'stat']
+
+def manifestPath(path):
+    return os.path.join(path, '_manifest.txt')
+
+def readManifest(path):
+    file = manifestPath(path)
+    if not os.path.exists(file):
+        return pd.DataFrame(columns = manifest_cols).set_index('key')
+    
+    manifest = pd.read_csv(file, sep = '\t', dtype = {'checksum': str, 'upstream': str, 'stat': str}, keep_default_na = False)
+    return manifest.set_index('key')
+
+def writeManifest(path, manifest):
+    os.makedirs(path, exist_ok = True)
+    manifest = manifest.sort_index().reset_index()[manifest_cols]
+    manifest = manifest.astype({'rows': 'int64', 'start': 'int64', 'end': 'int64'})
+    manifest.to_csv(manifestPath(path), sep = '\t', index = False)
+    return None
+
+# add or replace entry of an input or artifact
+def record(manifest, key, kind, checksum, rows = 0, start = -1, end = -1, upstream = '', stat = ''):
+    manifest.loc[key, manifest_cols[1:]] = [kind, checksum, rows, start, end, upstream, stat]
+    return manifest
+
+# drop entries of keys, e.g. artifacts to be rebuilt
+def drop(manifest, keys):
+    return manifest.drop(index = [key for key in keys if key in manifest.index])
+
+# current checksums of entries of a kind: {key: checksum}
+def checksums(manifest, kind = None):
+    entries = manifest if kind is None else manifest[manifest.kind == kind]
+    return entries.checksum.to_dict()
+
+# =============================================================================
+# checksums
+# =============================================================================
+
+def fileChecksum(file, block = 1 << 20):
+    digest = hashlib.sha256()
+    with open(file, 'rb') as f:
+        for chunk in iter(lambda: f.read(block), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# checksum of json-serializable results or parameters, e.g. match pairs, thresholds and approach config
+def dataChecksum(data):
+    return hashlib.sha256(json.dumps(data, sort_keys = True).encode()).hexdigest()
+
+def fileStat(file):
+    st = os.stat(file)
+    return str(st.st_size) + ':' + str(st.st_mtime_ns)
+
+# checksum of an input file, hashed only if its size or modification time changed
+def fileChecksumOf(manifest, key, file):
+    if key in manifest.index and manifest.loc[key, 'stat'] == fileStat(file):
+        return manifest.loc[key, 'checksum']
+    return fileChecksum(file)
+
+# checksum of typed columns of a partition
+def partitionChecksum(path):
+    digest = hashlib.sha256()
+    for col in store.cols:
+        digest.update(fileChecksum(os.path.join(path, col + '.npy')).encode())
+    return digest.hexdigest()
+
+# upstream of an artifact from {key: checksum} of its inputs
+# parameters an artifact depends on are inputs too, e.g. {'params': dataChecksum(params)}
+def upstreamOf(inputs):
+    return ';'.join(key + '@' + checksum for key, checksum in sorted(inputs.items()))
+
+# keys of inputs of an upstream
+def upstreamKeys(upstream):
+    return [item.rsplit('@', 1)[0] for item in upstream.split(';') if item != '']
+
+# artifact is current if recorded with the same upstream and still on disk
+def isCurrent(manifest, key, upstream, file = None):
+    if key not in manifest.index or manifest.loc[key, 'upstream'] != upstream:
+        return False
+    return file is None or os.path.exists(file)
+
+# =============================================================================
+# partitions of event store
+# =============================================================================
+
+# manifest key of a partition (path relative to store)
+def partitionKey(store_path, path):
+    return os.path.relpath(path, store_path).replace(os.sep, '/')
+
+# record a written partition with its checksum, row count and time range
+def recordPartition(manifest, store_path, path, upstream = ''):
+    ts = store.readPartition(path)['TimeStamp']
+    start, end = (int(ts[0]), int(ts[-1])) if len(ts) > 0 else (-1, -1)
+    return record(manifest, partitionKey(store_path, path), 'partition', partitionChecksum(path), len(ts), start, end, upstream)
+
+# checksum of a partition from the manifest, computed if the partition was not recorded
+def partitionChecksumOf(manifest, store_path, path):
+    key = partitionKey(store_path, path)
+    if key in manifest.index:
+        return manifest.loc[key, 'checksum']
+    return partitionChecksum(path)
+
+# summary of an artifact data frame: rows and time range of epoch milliseconds
+def frameSummary(df, col = 'TimeStamp'):
+    if len(df) == 0:
+        return {'rows': 0, 'start': -1, 'end': -1}
+    return {'rows': len(df), 'start': int(np.min(df[col])), 'end': int(np.max(df[col]))}
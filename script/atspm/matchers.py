@@ -0,0 +1,142 @@
+import ast
+import numpy as np
+
+from atspm import matching
+
+# =============================================================================
+# matchers: algorithms matching adv actuations to stop-bar actuations, plugged
+# into one engine of candidate pairs, assignment and evaluation (see atspm/matching.py)
+# matcher: {'name',
+#           'window': travel time window (s) of adv actuations, (tt_min, tt_max) scalars or arrays,
+#           'score': match strength of candidate pairs,
+#           'left': matcher of adv actuations over the left-turn lane to rear det, matched first; or None}
+# =============================================================================
+
+# proposed algorithm: empirical travel time window, ideal travel time to stop or run over stop-bar det
+def proposedMatcher(tt_min, tt_max, tt_ideal_stop, tt_ideal_run, left = None):
+    return {'name': 'proposed',
+            'window': lambda adf: (tt_min, tt_max),
+            'score': lambda pairs: matching.scoreProposed(pairs, tt_ideal_stop, tt_ideal_run),
+            'left': left}
+
+# left-turn stage of the proposed algorithm: adv actuations over lane to rear det actuations
+def leftMatcher(tt_min, tt_max, tt_ideal, lane = 2):
+    return {'name': 'left',
+            'lane': lane,
+            'window': lambda adf: (tt_min, tt_max),
+            'score': lambda pairs: matching.scoreLeft(pairs, tt_ideal),
+            'left': None}
+
+# Ding et al. (2016): window from spot speed at adv det and max acceleration
+def dingMatcher(eff_length_adv, eff_length_stop, dist_adv_stop, acc_max):
+    return {'name': 'Ding',
+            'window': lambda adf: matching.windowDing(adf, eff_length_adv, dist_adv_stop, acc_max),
+            'score': lambda pairs: matching.scoreDing(pairs, eff_length_adv, eff_length_stop, dist_adv_stop),
+            'left': None}
+
+# Lu et al. (2015): any later stop-bar actuation of the lane
+def luMatcher(eff_length_adv, eff_length_stop, dist_adv_stop):
+    return {'name': 'Lu',
+            'window': lambda adf: (0, np.inf),
+            'score': lambda pairs: matching.scoreLu(pairs, eff_length_adv, eff_length_stop, dist_adv_stop),
+            'left': None}
+
+# =============================================================================
+# matching engine
+# =============================================================================
+
+# assigned candidate pairs of adv actuations (adf) and target actuations (tdf) of a matcher
+# sequential assignment takes pairs in the order of the set of adv ids, sorted ids of adf if None (see atspm/matching.py)
+def matchStage(adf, tdf, matcher, method = 'greedy', by_lane = True, set_id_adv = None):
+    tt_min, tt_max = matcher['window'](adf)
+    pairs = matching.candidatePairs(adf, tdf, tt_min, tt_max, by_lane)
+    if method == 'sequential':
+        pairs = matching.setOrder(pairs, set(sorted(adf.ID)) if set_id_adv is None else set_id_adv, tdf, by_lane)
+    return matching.assign(pairs, matcher['score'](pairs), method)
+
+# match actuations of a filtered data frame (see atspm/process.py): left-turn stage, if any, then thru
+# returns left-turn matches {adv id: rear id}, thru matches {stop id: adv id} and actuation ids of each stage:
+# {'left', 'thru', 'id_adv_left', 'id_adv', 'id_stop'}
+def matchEvents(df, matcher, method = 'greedy'):
+    adf = df[df.Det == 'adv']
+    sdf = df[df.Det == 'stop']
+    ldf = df[df.Det == 'rear']
+    
+    left, id_adv_left, set_id_adv = {}, set(), None
+    if matcher['left'] is not None:
+        # later rear det actuations of any lane within travel time window of adv actuations over left-turn lane
+        left_adf = adf[adf.Lane == matcher['left']['lane']]
+        left_matches = matchStage(left_adf, ldf, matcher['left'], method, by_lane = False)
+        left = dict(zip(left_matches.adv_id.tolist(), left_matches.stop_id.tolist()))
+        id_adv_left = set(left_adf.ID.tolist())
+        
+        # adv actuations matched as left-turning are not matched to stop-bar det
+        set_id_adv = set(sorted(adf.ID)) - set(left)
+        adf = adf[~adf.ID.isin(list(left))]
+    
+    # later stop-bar actuations of the same lane
+    thru_matches = matchStage(adf, sdf, matcher, method, set_id_adv = set_id_adv)
+    
+    return {'left': left,
+            'thru': dict(zip(thru_matches.stop_id.tolist(), thru_matches.adv_id.tolist())),
+            'id_adv_left': id_adv_left,
+            'id_adv': set(adf.ID.tolist()),
+            'id_stop': set(sdf.ID.tolist())}
+
+# =============================================================================
+# evaluation against video-verified matches
+# =============================================================================
+
+# video-verified matches of calibration files: {file number: {id: id}}
+def readVerified(file):
+    with open(file) as f:
+        return ast.literal_eval(f.read())
+
+# confusion counts of left-turn matches {adv id: rear id}
+# adv actuations over left-turn lane without a match are classified as thru going
+def evaluateLeft(match_pairs, result_pairs, id_adv_left):
+    match_pairs_full = {**{i: 0 for i in id_adv_left}, **match_pairs}
+    
+    TP = len(set(match_pairs.items()).intersection(result_pairs.items()))
+    FP = len(set(match_pairs.items()).difference(result_pairs.items()))
+    FN = len(set(result_pairs.items()).difference(match_pairs_full.items()))
+    
+    return {'TP': TP, 'FP': FP, 'FN': FN, 'TN': len(id_adv_left) - TP - FP - FN}
+
+# confusion counts of thru matches {stop id: adv id}
+# true negatives: stop-bar and adv actuations neither in result nor in match
+def evaluateThru(match_pairs, result_pairs, id_adv, id_stop):
+    TN_stop = id_stop.difference(result_pairs.keys()).difference(match_pairs.keys())
+    TN_adv = id_adv.difference(result_pairs.values()).difference(match_pairs.values())
+    
+    return {'TP': len(set(match_pairs.items()).intersection(result_pairs.items())),
+            'FP': len(set(match_pairs.items()).difference(result_pairs.items())),
+            'FN': len(set(result_pairs.items()).difference(match_pairs.items())),
+            'TN': len(TN_stop) + len(TN_adv)}
+
+# evaluation of matches of a file (see matchEvents) against its video-verified left-turn and thru matches
+def evaluate(matches, left_result_pairs, thru_result_pairs):
+    return {'left': evaluateLeft(matches['left'], left_result_pairs, matches['id_adv_left']),
+            'thru': evaluateThru(matches['thru'], thru_result_pairs, matches['id_adv'], matches['id_stop'])}
+
+# confusion counts summed over files
+def totals(counts):
+    return {k: sum(count[k] for count in counts) for k in ['TP', 'FP', 'FN', 'TN']}
+
+# precision, recall and f1 score of confusion counts summed over files
+def accuracy(counts, digits = 4):
+    total = totals(counts)
+    TP, FP, FN = total['TP'], total['FP'], total['FN']
+    
+    precision = round(TP / (TP + FP), digits)
+    recall = round(TP / (TP + FN), digits)
+    f1_score = round(2/(1/precision + 1/recall), digits)
+    
+    return {'precision': precision, 'recall': recall, 'f1_score': f1_score}
+
+# evaluations of matchers {name: matcher} on data frames of calibration files, read once: [df] of each file
+# returns {name: [evaluation of each file]}
+def compare(dfs, algorithms, left_result, thru_result, method = 'greedy'):
+    return {name: [evaluate(matchEvents(df, matcher, method), left_result[file_num + 1], thru_result[file_num + 1])
+                   for file_num, df in enumerate(dfs)]
+            for name, matcher in algorithms.items()}
@@ -0,0 +1,241 @@
+import numpy as np
+import pandas as pd
+
+from atspm import intervals
+
+# =============================================================================
+# candidate pairs table: adv actuations to later actuations at a target detector
+# (stop-bar or rear det) within travel time windows; target timestamps sorted per
+# lane and searched in bulk, so only pairs within a window are generated
+# =============================================================================
+
+# candidate pairs of adv actuations (adf) and target actuations (tdf) of the same lane, or of any lane
+# if by_lane is False, with travel time (s) within [tt_min, tt_max]: scalars or arrays aligned with adf
+# adv_idx, stop_idx: positions in adf, tdf; lane: lane searched (0 if not by lane)
+# pairs ordered by adv actuation, then by target timestamp
+def candidatePairs(adf, tdf, tt_min, tt_max, by_lane = True):
+    n = len(adf)
+    tt_min = np.broadcast_to(np.asarray(tt_min, dtype = 'float64'), n)
+    tt_max = np.broadcast_to(np.asarray(tt_max, dtype = 'float64'), n)
+    adv_ts = adf.TimeStamp.values.astype('int64')
+    
+    # target actuations sorted by lane and timestamp; bounds of each adv actuation's window in its lane
+    adv_lane = adf.Lane.values if by_lane else np.zeros(n, dtype = 'int8')
+    target_lane = tdf.Lane.values if by_lane else np.zeros(len(tdf), dtype = 'int8')
+    order = np.lexsort((tdf.TimeStamp.values, target_lane))
+    ts, lanes = tdf.TimeStamp.values.astype('int64')[order], target_lane[order]
+    
+    lo, hi = np.zeros(n, dtype = 'int64'), np.zeros(n, dtype = 'int64')
+    for lane in np.unique(adv_lane):
+        rows = np.flatnonzero(adv_lane == lane)
+        first, last = np.searchsorted(lanes, lane, side = 'left'), np.searchsorted(lanes, lane, side = 'right')
+        lo[rows] = first + np.searchsorted(ts[first:last], adv_ts[rows] + tt_min[rows] * 1000 - 1, side = 'left')
+        hi[rows] = np.maximum(lo[rows], first + np.searchsorted(ts[first:last], adv_ts[rows] + tt_max[rows] * 1000 + 1, side = 'right'))
+    
+    # expand windows to pairs; windows are searched 1 ms wider and checked on travel times as computed
+    counts = hi - lo
+    adv_idx = np.repeat(np.arange(n), counts)
+    sorted_idx = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(lo, counts)
+    tt = intervals.seconds(ts[sorted_idx], adv_ts[adv_idx])
+    keep = (ts[sorted_idx] > adv_ts[adv_idx]) & (tt >= tt_min[adv_idx]) & (tt <= tt_max[adv_idx])
+    adv_idx, stop_idx, tt = adv_idx[keep], order[sorted_idx[keep]], tt[keep]
+    
+    # parameters of pairs; nan if not processed for target actuations (e.g. rear det)
+    def values(df, col, idx):
+        return df[col].values[idx] if col in df.columns else np.full(len(idx), np.nan)
+    
+    return pd.DataFrame({'adv_idx': adv_idx,
+                         'stop_idx': stop_idx,
+                         'lane': adv_lane[adv_idx],
+                         'adv_id': adf.ID.values[adv_idx],
+                         'stop_id': tdf.ID.values[stop_idx],
+                         'travel_time': tt,
+                         'adv_occ': values(adf, 'OccTime', adv_idx),
+                         'stop_occ': values(tdf, 'OccTime', stop_idx),
+                         'stop_SCA': values(tdf, 'SCA', stop_idx)})
+
+# =============================================================================
+# scoring rules: match strength of all candidate pairs as array operations
+# =============================================================================
+
+# inverse of travel time error, rounded; zero errors count as 0.1 (avoid zero division)
+def inverseError(diff):
+    diff = np.abs(diff)
+    return np.round(1 / np.where(diff == 0, 0.1, diff), 2)
+
+# proposed algorithm: error to ideal travel time of vehicles stopping (SCA 'RG' at stop bar) or running
+def scoreProposed(pairs, tt_ideal_stop, tt_ideal_run):
+    tt_ideal = np.where(pairs.stop_SCA == 'RG', tt_ideal_stop, tt_ideal_run)
+    return inverseError(pairs.travel_time.values - tt_ideal)
+
+# left-turn: error to ideal travel time from adv det to rear det
+def scoreLeft(pairs, tt_ideal):
+    return inverseError(pairs.travel_time.values - tt_ideal)
+
+# expected travel time of uniform acceleration between spot speeds over adv and stop-bar det
+def expectedTravelTime(pairs, eff_length_adv, eff_length_stop, dist_adv_stop):
+    adv_vel = eff_length_adv / pairs.adv_occ.values
+    stop_vel = eff_length_stop / pairs.stop_occ.values
+    return 2*dist_adv_stop / (adv_vel + stop_vel)
+
+# Ding et al. (2016): travel time window of adv actuations from spot speed over adv det and max acceleration
+def windowDing(adf, eff_length_adv, dist_adv_stop, acc_max):
+    adv_vel = eff_length_adv / adf.OccTime.values
+    tt_max = 2*dist_adv_stop / adv_vel
+    tt_min = 2*dist_adv_stop / (adv_vel + ((adv_vel)**2 + 2*acc_max*dist_adv_stop)**(1/2))
+    return tt_min, tt_max
+
+# Ding et al. (2016): one minus relative error of travel time to expected travel time
+def scoreDing(pairs, eff_length_adv, eff_length_stop, dist_adv_stop):
+    tt_ideal = expectedTravelTime(pairs, eff_length_adv, eff_length_stop, dist_adv_stop)
+    return np.round(1 - np.abs(1 - tt_ideal / pairs.travel_time.values), 2)
+
+# Lu et al. (2015): inverse error of travel time to expected travel time
+def scoreLu(pairs, eff_length_adv, eff_length_stop, dist_adv_stop):
+    tt_expected = expectedTravelTime(pairs, eff_length_adv, eff_length_stop, dist_adv_stop)
+    return inverseError(pairs.travel_time.values - tt_expected)
+
+# =============================================================================
+# assignment of candidate pairs to matches of adv and target actuations
+# sequential: assignment of the original scripts, pairs taken in order (see setOrder); matches of published
+# calibration results (data/calibration), not strictly one-to-one
+# greedy, optimal: one-to-one matches, depending only on pairs and strengths, not on the order of pairs;
+# pairs without positive strength are not assigned
+# =============================================================================
+
+# pairs in the order of iterating sets of actuation ids as in the original scripts: adv ids, then target ids of the lane
+def setOrder(pairs, set_id_adv, tdf, by_lane = True):
+    adv_rank = {i: n for n, i in enumerate(set_id_adv)}
+    lanes = tdf.groupby('Lane', sort = False).ID if by_lane else [(0, tdf.ID)]
+    target_rank = {j: n for lane, ids in lanes for n, j in enumerate(set(ids))}
+    
+    order = np.lexsort((pairs.stop_id.map(target_rank).values, pairs.adv_id.map(adv_rank).values))
+    return pairs.iloc[order].reset_index(drop = True)
+
+# sequential: a pair of actuations not yet seen is assigned and both are seen; a pair of a seen actuation
+# is assigned if stronger than the last assigned pairs of its seen actuations, replacing the assigned pair
+# of its target actuation only
+def assignSequential(pairs, strength):
+    assigned = {} # assigned pair of each target id: {target id: position}
+    seen_adv_id, seen_target_id = set(), set()
+    strength_adv, strength_target = {}, {} # strength of last assigned pair of each adv, target id
+    
+    for k, (i, j, value) in enumerate(zip(pairs.adv_id.tolist(), pairs.stop_id.tolist(), np.asarray(strength, dtype = 'float64').tolist())):
+        seen = ([strength_adv[i]] if i in seen_adv_id else []) + ([strength_target[j]] if j in seen_target_id else [])
+        if len(seen) == 0:
+            seen_adv_id.add(i)
+            seen_target_id.add(j)
+        elif value <= max(seen):
+            continue
+        
+        assigned[j] = k
+        strength_adv[i], strength_target[j] = value, value
+    
+    return np.array(list(assigned.values()), dtype = 'int64')
+
+# greedy by strength: strongest pairs first, ties broken by adv id, then target id
+def assignGreedy(pairs, strength):
+    strength = np.asarray(strength, dtype = 'float64')
+    order = np.lexsort((pairs.stop_id.values, pairs.adv_id.values, -strength))
+    order = order[strength[order] > 0]
+    
+    seen_adv_id, seen_target_id, assigned = set(), set(), []
+    for k, i, j in zip(order.tolist(), pairs.adv_id.values[order].tolist(), pairs.stop_id.values[order].tolist()):
+        if i not in seen_adv_id and j not in seen_target_id:
+            seen_adv_id.add(i)
+            seen_target_id.add(j)
+            assigned.append(k)
+    
+    return np.array(assigned, dtype = 'int64')
+
+# blocks of connected pairs: pairs sharing an adv or target actuation are in the same block
+# target ids of an adv actuation span a range of its lane; overlapping ranges of a lane are merged
+def pairBlocks(pairs):
+    ranges = pairs.groupby(['lane', 'adv_id']).stop_id.agg(['min', 'max']).reset_index()
+    ranges = ranges.sort_values(by = ['lane', 'min', 'adv_id'])
+    reach = ranges.groupby('lane')['max'].cummax().groupby(ranges.lane).shift()
+    block = (reach.isna() | (ranges['min'] > reach)).cumsum()
+    return pairs.adv_id.map(dict(zip(ranges.adv_id, block))).values
+
+# min-cost assignment of each row of a cost matrix (rows <= columns) to a distinct column
+# Hungarian algorithm with shortest augmenting paths, O(n^2 m); returns column of each row
+def minCostAssignment(cost):
+    n, m = cost.shape
+    u, v = np.zeros(n + 1), np.zeros(m + 1) # potentials of rows, columns
+    p, way = np.zeros(m + 1, dtype = 'int64'), np.zeros(m + 1, dtype = 'int64') # row of each column (1-based), path
+    cols = np.maximum(np.arange(m + 1) - 1, 0) # column 0: start of path, always used
+    
+    for i in range(1, n + 1):
+        p[0], j0 = i, 0
+        minv, used = np.full(m + 1, np.inf), np.zeros(m + 1, dtype = bool)
+        while p[j0] != 0 or j0 == 0:
+            used[j0] = True
+            i0 = p[j0]
+            
+            # reduced costs of free columns from row i0
+            free = ~used
+            reduced = np.where(free, cost[i0 - 1, cols] - u[i0] - v, np.inf)
+            better = free & (reduced < minv)
+            minv[better], way[better] = reduced[better], j0
+            
+            j1 = int(np.argmin(np.where(free, minv, np.inf)))
+            delta = minv[j1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[free] -= delta
+            j0 = j1
+        
+        # augment along path
+        while j0 != 0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    
+    col = np.full(n, -1, dtype = 'int64')
+    col[p[1:][p[1:] > 0] - 1] = np.flatnonzero(p[1:] > 0)
+    return col
+
+# optimal: max total strength of one-to-one matches, solved in each block of connected pairs
+def assignOptimal(pairs, strength):
+    strength = np.asarray(strength, dtype = 'float64')
+    positive = np.flatnonzero(strength > 0)
+    pairs = pairs.iloc[positive]
+    
+    # rows of pairs of each block
+    block = pairBlocks(pairs)
+    order = np.argsort(block, kind = 'stable')
+    
+    assigned = []
+    for rows in np.split(order, np.flatnonzero(np.diff(block[order])) + 1) if len(order) > 0 else []:
+        adv_ids, i = np.unique(pairs.adv_id.values[rows], return_inverse = True)
+        target_ids, j = np.unique(pairs.stop_id.values[rows], return_inverse = True)
+        
+        # dense strength matrix of the block, zero if not a candidate pair
+        weight = np.zeros((len(adv_ids), len(target_ids)))
+        weight[i, j] = strength[positive[rows]]
+        index = np.full(weight.shape, -1, dtype = 'int64')
+        index[i, j] = positive[rows]
+        
+        # one adv or target actuation: strongest pair
+        if len(adv_ids) == 1 or len(target_ids) == 1:
+            k = index.ravel()[[np.argmax(weight.ravel())]]
+        elif len(adv_ids) <= len(target_ids):
+            rows_col = minCostAssignment(-weight)
+            k = index[np.arange(len(adv_ids)), rows_col]
+        else:
+            cols_row = minCostAssignment(-weight.T)
+            k = index[cols_row, np.arange(len(target_ids))]
+        assigned.append(k[k >= 0])
+    
+    return np.sort(np.concatenate(assigned)) if len(assigned) > 0 else np.array([], dtype = 'int64')
+
+assign_methods = {'sequential': assignSequential, 'greedy': assignGreedy, 'optimal': assignOptimal}
+
+# assigned pairs with strength, ordered by target id
+def assign(pairs, strength, method = 'greedy'):
+    if method not in assign_methods:
+        raise ValueError("Unknown assignment method: " + str(method))
+    
+    assigned = assign_methods[method](pairs, strength)
+    matches = pairs.iloc[assigned].assign(strength = np.asarray(strength, dtype = 'float64')[assigned])
+    return matches.sort_values(by = 'stop_id').reset_index(drop = True)
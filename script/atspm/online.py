@@ -0,0 +1,195 @@
+import time
+import itertools
+import numpy as np
+import pandas as pd
+
+from atspm import store, actuations, matching, stream
+
+# =============================================================================
+# online matcher: matches of adv actuations to stop-bar and rear det actuations
+# over a stream of processed actuations in time order (see atspm/matchers.py)
+# adv actuations wait in a per-lane buffer until their travel time window has
+# passed (tt_max after detection), then take the target assigned among all
+# pending adv actuations, so stronger claims of later adv actuations are kept;
+# latency of a match is bounded by tt_max and the step of the stream
+# chunks: (data frame of processed actuations, watermark): every actuation
+# before the watermark (epoch ms) has been received
+#
+# approximation of the batch matcher (matchers.matchEvents) for bounded latency:
+# - pending adv actuations competing with an expired one have not seen all targets of
+#   their windows; a later target that would draw one of them away is not known yet
+# - adv actuations over the left-turn lane compete in the thru stage only once their
+#   left-turn window has passed
+# both only change matches of targets within reach of several adv actuations of a lane;
+# on synthetic traffic (see check_match_stream.py) matches are identical when windows of a lane
+# do not overlap, and about 97% of batch thru matches are kept at headways of 1.5 to 6 s
+# =============================================================================
+
+# finalized matches; ids of processed files with the hour key of their file (YYYYMMDD_HH: ids repeat across files),
+# stream time (ms) of finalization
+match_cols = ['stage', 'adv_hour', 'adv_id', 'target_hour', 'target_id', 'adv_ts', 'target_ts', 'lane', 'travel_time', 'strength', 'watermark']
+
+# no finalized matches, shared by all chunks without matches (not to be modified)
+no_matches = pd.DataFrame(columns = match_cols)
+
+# hour keys of processed files (see process_events_bulk.py) of timestamps
+def hourKeys(ts):
+    return [date + '_' + str(hour).zfill(2) for date, hour in map(store.partitionKey, ts)]
+
+def append(buf, df):
+    return df if buf is None else pd.concat([buf, df], ignore_index = True)
+
+# travel time window (ms) of adv actuations: first and last timestamp of targets
+def windowRange(adf, matcher):
+    tt_min, tt_max = (np.broadcast_to(np.asarray(tt, dtype = 'float64'), len(adf)) for tt in matcher['window'](adf))
+    if not np.isfinite(tt_max).all():
+        raise ValueError("Unbounded travel time window of matcher: " + str(matcher['name']))
+    ts = adf.TimeStamp.values
+    return ts + np.floor(tt_min * 1000).astype('int64'), ts + np.ceil(tt_max * 1000).astype('int64')
+
+# assign pending adv actuations to targets (tdf); assignments of expired adv actuations are final
+# returns finalized matches, ids of expired adv actuations, and final assignment of stream ids
+def finalize(pending, expired, tdf, matcher, method, by_lane, stage, watermark):
+    if not expired.any():
+        return no_matches, [], pd.DataFrame(columns = ['adv_id', 'stop_id'])
+    
+    pairs = matching.candidatePairs(pending, tdf, *matcher['window'](pending), by_lane = by_lane)
+    assigned = matching.assign(pairs, matcher['score'](pairs), method)
+    assigned = assigned[expired[assigned.adv_idx.values]]
+    
+    adv_ts, target_ts = pending.TimeStamp.values[assigned.adv_idx], tdf.TimeStamp.values[assigned.stop_idx]
+    matches = pd.DataFrame({'stage': stage,
+                            'adv_hour': hourKeys(adv_ts),
+                            'adv_id': pending.FileID.values[assigned.adv_idx],
+                            'target_hour': hourKeys(target_ts),
+                            'target_id': tdf.FileID.values[assigned.stop_idx],
+                            'adv_ts': adv_ts,
+                            'target_ts': target_ts,
+                            'lane': pending.Lane.values[assigned.adv_idx],
+                            'travel_time': assigned.travel_time.values,
+                            'strength': assigned.strength.values,
+                            'watermark': watermark}, columns = match_cols)
+    return matches, pending.ID.values[expired].tolist(), assigned
+
+# match processed actuations of chunks by a matcher, left-turn stage first if any
+# yields (matches, watermark, stats) after each chunk: pairs finalized with the chunk and
+# stats of buffers {'pending', 'targets', 'finalized', 'forced'}
+# max_pending: adv actuations pending per lane; the oldest are finalized early if exceeded
+# actuations are identified by their sequence in the stream, as ids of processed files repeat
+def matchStream(chunks, matcher, method = 'greedy', max_pending = 1000):
+    left = matcher['left']
+    adv = stop = rear = None # buffers of pending adv actuations and of targets
+    received, n_adv = [], 0 # chunks received since last finalization, adv actuations pending
+    seq, last = 0, 0
+    next_end = stream.ts_max # first end of windows of pending adv actuations
+    
+    for chunk in itertools.chain(chunks, [None]):
+        # end of stream: every window has passed, matches are finalized at the last watermark
+        df, watermark = (None, stream.ts_max) if chunk is None else chunk
+        last = last if chunk is None else watermark
+        
+        if df is not None and len(df) > 0:
+            received.append(df)
+            new_adv = df[df.Det.values == 'adv']
+            if len(new_adv) > 0:
+                ends = windowRange(new_adv, matcher)[1] # bounded windows only
+                if left is not None:
+                    ends = np.where(new_adv.Lane.values == left['lane'], windowRange(new_adv, left)[1], ends)
+                next_end, n_adv = min(next_end, ends.min()), n_adv + len(new_adv)
+        
+        # nothing to finalize before the first window ends, unless a lane is over max_pending
+        stats = {'pending': n_adv, 'targets': 0 if stop is None else len(stop) + len(rear), 'finalized': 0, 'forced': 0}
+        if watermark <= next_end and n_adv <= max_pending:
+            yield no_matches, watermark, stats
+            continue
+        
+        # add actuations received to buffers
+        if len(received) > 0:
+            df = pd.concat(received, ignore_index = True)
+            df = df.rename(columns = {'ID': 'FileID'}).assign(ID = np.arange(seq, seq + len(df)))
+            seq, received = seq + len(df), []
+            
+            new_adv = df[df.Det == 'adv'].assign(LeftOpen = False)
+            if left is not None:
+                new_adv['LeftOpen'] = new_adv.Lane.values == left['lane']
+            
+            adv = append(adv, new_adv)
+            stop = append(stop, df[df.Det == 'stop'])
+            rear = append(rear, df[df.Det == 'rear'])
+        
+        # oldest adv actuations of lanes over max_pending are finalized now
+        rank = adv.groupby('Lane', observed = True).cumcount(ascending = False).values
+        forced = adv.ID.values[rank >= max_pending]
+        
+        emitted, done = [], set()
+        
+        # left-turn stage: adv actuations over left-turn lane to rear det actuations of any lane
+        if left is not None and adv.LeftOpen.any():
+            pending = adv[adv.LeftOpen.values]
+            expired = (windowRange(pending, left)[1] < watermark) | np.isin(pending.ID.values, forced)
+            matches, finalized, assigned = finalize(pending, expired, rear, left, method, False, 'left', last)
+            emitted.append(matches)
+            
+            # matched adv actuations are done, unmatched go on to thru stage
+            done.update(assigned.adv_id.tolist())
+            adv = adv.assign(LeftOpen = adv.LeftOpen.values & ~adv.ID.isin(finalized).values)
+            rear = rear[~rear.ID.isin(assigned.stop_id)]
+        
+        # thru stage: adv actuations not matched as left-turning, to stop-bar actuations of the same lane
+        pending = adv[~adv.LeftOpen.values & ~adv.ID.isin(done).values]
+        expired = (windowRange(pending, matcher)[1] < watermark) | np.isin(pending.ID.values, forced)
+        matches, finalized, assigned = finalize(pending, expired, stop, matcher, method, True, 'thru', last)
+        emitted.append(matches)
+        
+        done.update(finalized)
+        adv = adv[~adv.ID.isin(done)]
+        stop = stop[~stop.ID.isin(assigned.stop_id)]
+        
+        # drop targets before windows of pending adv actuations; later adv actuations reach targets after watermark
+        reach = min(windowRange(adv, matcher)[0].min(), watermark) if len(adv) > 0 else watermark
+        stop = stop[stop.TimeStamp.values >= reach]
+        if left is not None:
+            left_adv = adv[adv.LeftOpen.values]
+            reach = min(windowRange(left_adv, left)[0].min(), watermark) if len(left_adv) > 0 else watermark
+            rear = rear[rear.TimeStamp.values >= reach]
+        
+        ends = [windowRange(adv[~adv.LeftOpen.values], matcher)[1]]
+        if left is not None:
+            ends.append(windowRange(left_adv, left)[1])
+        next_end = min(np.concatenate(ends).min(), stream.ts_max) if len(adv) > 0 else stream.ts_max
+        
+        n_adv = len(adv)
+        stats.update(pending = len(adv), targets = len(stop) + len(rear), finalized = len(done), forced = len(forced))
+        yield pd.concat(emitted, ignore_index = True), watermark, stats
+
+# =============================================================================
+# file-replay source standing in for a live feed
+# =============================================================================
+
+# processed actuation files (see atspm/process.py) in time order, replayed in steps (ms) of stream time
+# yields (chunk, watermark) of each step; speed: stream time per wall-clock time, None as fast as possible
+# a step is complete once a later actuation is read, actuations of later files are not earlier
+def replayFiles(files, step = 1000, speed = None):
+    carry, lo, clock = None, None, None
+    
+    for file in itertools.chain(files, [None]):
+        df = carry if file is None else actuations.readActuations(file)
+        if file is not None and carry is not None:
+            df = actuations.compact(pd.concat([carry, df], ignore_index = True))
+        if df is None or len(df) == 0:
+            continue
+        
+        df = df.sort_values(by = 'TimeStamp', kind = 'stable')
+        ts = df.TimeStamp.values
+        lo = ts[0] // step * step if lo is None else lo
+        clock = (time.time(), lo) if clock is None else clock
+        
+        i = 0
+        while lo + step <= ts[-1] or (file is None and lo <= ts[-1]):
+            j = np.searchsorted(ts, lo + step)
+            if speed is not None:
+                time.sleep(max(0, clock[0] + (lo + step - clock[1]) / 1000 / speed - time.time()))
+            yield df.iloc[i:j], lo + step
+            i, lo = j, lo + step
+        
+        carry = df.iloc[i:]
@@ -0,0 +1,58 @@
+import os
+import plotly.express as px
+from concurrent.futures import ThreadPoolExecutor
+
+from atspm.timestamps import toDatetime
+
+# =============================================================================
+# event scatter plots: raw points for short windows, per-channel time bins otherwise
+# =============================================================================
+
+max_bins = 2000 # time bins per channel, about the width of a screen in pixels
+raw_span = 1800000 # windows up to 30 minutes (epoch milliseconds) are plotted as raw points
+
+# aggregate events into time bins per channel (and color): bin start, event count
+def binEvents(df, y, color = None, bins = max_bins, col = 'TimeStamp'):
+    ts = df[col].values
+    start = ts.min()
+    width = max(1, -(-(ts.max() - start + 1) // bins)) # milliseconds per bin
+    
+    keys = [y] if color is None else [y, color]
+    bdf = df[keys].assign(Bin = (ts - start) // width)
+    bdf = bdf.groupby(keys + ['Bin'], observed = True, sort = False).size().reset_index(name = 'Events')
+    
+    bdf[col] = start + bdf.Bin * width
+    return bdf.drop('Bin', axis = 1).sort_values(by = col, kind = 'stable')
+
+# scatter of events with WebGL traces; timestamps in epoch milliseconds
+# hover_name, hover_data apply to raw points only, binned points show event counts
+def scatterEvents(df, y, color = None, bins = max_bins, raw_span = raw_span, marker_size = 10, **kwargs):
+    span = df.TimeStamp.max() - df.TimeStamp.min() if len(df) > 0 else 0
+    
+    if span <= raw_span:
+        xdf = df.assign(TimeStamp = toDatetime(df.TimeStamp))
+    else:
+        xdf = binEvents(df, y, color, bins)
+        xdf['TimeStamp'] = toDatetime(xdf.TimeStamp)
+        kwargs = {key: value for key, value in kwargs.items() if key not in ('hover_name', 'hover_data')}
+        kwargs['hover_data'] = ['Events']
+        marker_size = min(marker_size, 6)
+    
+    fig = px.scatter(xdf, x = 'TimeStamp', y = y, color = color, render_mode = 'webgl', **kwargs)
+    return fig.update_traces(marker = dict(size = marker_size))
+
+# =============================================================================
+# write figures headless
+# =============================================================================
+
+# write html files of figures {output_path: fig} in a thread pool; plotly.js is loaded from CDN
+def writeFigures(figures, num_workers = 4):
+    def writeFigure(output_path, fig):
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok = True)
+        fig.write_html(output_path, include_plotlyjs = 'cdn')
+        return os.path.getsize(output_path)
+    
+    with ThreadPoolExecutor(max_workers = num_workers) as pool:
+        sizes = list(pool.map(writeFigure, figures.keys(), figures.values()))
+    
+    return dict(zip(figures.keys(), sizes))
@@ -0,0 +1,201 @@
+import os
+import time
+import traceback
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from atspm import store, query, actuations, cycles, manifest, intersections, frames
+
+# =============================================================================
+# per-partition event processing for dilemma zone analysis: cycle, SCA and OHG
+# parameters of thru actuations, filtered to actuations susceptible to dilemma zone
+# events of a partition are read once and processed for each configured approach
+# functions depend only on the partition, its events and the configuration, so
+# partitions can be processed in parallel worker processes
+# config of an approach (see atspm/intersections.py) with thresholds:
+# {'phase', 'det', 'lane', 'crit': {'TUY_adv', 'AIY_adv', 'TUY_stop', 'AIY_stop'}}
+# =============================================================================
+
+on, off = actuations.on, actuations.off
+
+# columns of processed thru actuations
+thru_cols = ['TimeStamp', 'Parameter', 'Lane', 'Det', 'CycleNum', 'AIY', 'TUY', 'TUG'] + actuations.ohg_cols
+
+def thruDetectors(config):
+    return config['det']['adv'] + config['det']['stop']
+
+# phase change and detection events of a partition for all approaches {approach: config}, read once
+def readEvents(store_path, device, date, hour, configs):
+    params = intersections.thruPhases(configs) + intersections.detectors(configs)
+    return query.frame(query.hourEvents(store_path, device, date, hour, event_ids = list(cycles.pse.values()) + [on, off], params = params))
+
+# cycle table of a partition: computed once, memoized and persisted next to the store (see atspm/cycles.py)
+def phaseChanges(partition, config, edf):
+    return cycles.cycleTable(partition, config['phase']['thru'], edf)
+
+# add lane position and detector type of thru actuations (coded, see atspm/actuations.py)
+def addLaneDet(ddf, config):
+    det, lane = config['det'], config['lane']
+    ddf['Lane'] = ddf.Parameter.map(lane['adv'] | lane['stop']).astype(actuations.schema['Lane'])
+    ddf['Det'] = pd.Categorical(np.where(ddf.Parameter.isin(det['adv']), 'adv', 'stop'), dtype = actuations.schema['Det'])
+    return ddf
+
+def detectorActuations(partition, config, edf):
+    # detection on/off events of thru detectors within cycle min-max time
+    cycle_range = phaseChanges(partition, config, edf)['cycle_range']
+    ddf = edf[edf.EventID.isin([on, off]) & edf.Parameter.isin(thruDetectors(config))]
+    
+    # exclude bounds of cycle min-max time
+    ddf = query.window(ddf, cycle_range['min'], cycle_range['max'], closed = 'neither').copy()
+    return addLaneDet(ddf, config)
+
+# returns merged data frame and orphan on/off events repaired per detector (see atspm/actuations.py)
+def mergedEvents(partition, config, edf):
+    # check phase parameters
+    phase_changes = phaseChanges(partition, config, edf)
+    
+    # check detector parameters
+    ddf = detectorActuations(partition, config, edf)
+    
+    # signal indication, cycle and phase parameters at each on/off actuation (see atspm/cycles.py)
+    state = cycles.asOf(phase_changes, ddf.TimeStamp.values)
+    
+    # signal change during actuation (SCA) and OHG parameters of all detectors in one pass
+    # on/off paired over each detector, orphan on/off events dropped; parameters of detection on events
+    sca_ohg = actuations.scaOHG(ddf.TimeStamp.values, ddf.EventID.values, ddf.Parameter.values, state['Signal'], thruDetectors(config))
+    
+    mdf = ddf.assign(CycleNum = state['CycleNum'], AIY = state['AIY'], TUY = state['TUY'], TUG = state['TUG'],
+                     **actuations.toColumns(sca_ohg, len(ddf)))
+    
+    # keep events with detection on
+    mdf = mdf[mdf.EventID == on].drop('EventID', axis = 1)
+    
+    # drop rows with SCA == Nan
+    mdf.dropna(subset = ['SCA'], axis = 0, inplace = True)
+    
+    return actuations.compact(mdf), sca_ohg['repairs']
+
+# detection on the left-turn rear detector
+def leftEvents(edf, config):
+    mdf_left = edf[(edf.EventID == on) & (edf.Parameter == config['det']['rear'])].drop('EventID', axis = 1)
+    
+    # add lane and det parameters
+    mdf_left['Lane'] = -1
+    mdf_left['Det'] = 'rear'
+    return actuations.compact(mdf_left)
+
+# actuations susceptible to dilemma zone at adv det, potential matches at stop-bar det, and left-turn actuations
+def filterEvents(mdf_thru, mdf_left, config):
+    crit = config['crit']
+    
+    # merge thru and left data frames
+    mdf = actuations.compact(pd.concat([mdf_thru, mdf_left]).sort_values(by = 'TimeStamp'))
+    mdf.reset_index(drop = True, inplace = True)
+    
+    # create ID for each actuation
+    mdf['ID'] = mdf.index + 100000 # adv det IDs start with 1
+    mdf.loc[mdf.Det == 'stop', 'ID'] = mdf.ID + 100000 # stop-bar det IDs start with 2
+    mdf.loc[mdf.Lane == -1, 'ID'] = mdf.ID + 200000 # left-turn det IDs start with 3
+    
+    tdf = mdf.copy(deep = True) # temp data frame
+    
+    # filter out SCA (YG, RY, GR) over stop-bar and adv det
+    remove_SCA = ['YG', 'RY', 'GR']
+    tdf = tdf.drop(tdf[(tdf.Det.isin(['adv', 'stop'])) & (tdf.SCA.isin(remove_SCA))].index)
+    
+    # filter actuation at adv det susceptible to dilemma zone
+    df_crit_adv = tdf[(tdf.Det == 'adv') & ((tdf.TUY <= crit['TUY_adv']) | (tdf.AIY <= crit['AIY_adv']))]
+    id_adv = set(df_crit_adv.ID)
+    
+    # filter potential set of corresponding matches at stop-bar
+    df_crit_stop = tdf[(tdf.Det == 'stop') & ((tdf.TUY <= crit['TUY_stop']) | (tdf.AIY <= crit['AIY_stop']))]
+    id_stop = set(df_crit_stop.ID)
+    
+    # union set of ids
+    id_adv_stop = sorted(set.union(id_adv, id_stop))
+    
+    # filtered data frame
+    return tdf[(tdf.Lane == -1) | (tdf.ID.isin(id_adv_stop))]
+
+# =============================================================================
+# repaired on/off events per detector-hour of an output directory: <path>/_repairs.txt
+# =============================================================================
+
+repairs_cols = ['key', 'Parameter', 'OrphanOn', 'OrphanOff']
+
+def repairsPath(path):
+    return os.path.join(path, '_repairs.txt')
+
+def readRepairs(path):
+    file = repairsPath(path)
+    if not os.path.exists(file):
+        return pd.DataFrame(columns = repairs_cols)
+    return pd.read_csv(file, sep = '\t')
+
+def writeRepairs(path, repairs):
+    repairs = repairs.sort_values(by = ['key', 'Parameter'])[repairs_cols]
+    repairs.to_csv(repairsPath(path), sep = '\t', index = False)
+    return None
+
+# replace repairs of output keys; rows: [{'Parameter', 'OrphanOn', 'OrphanOff'}] of each key
+def updateRepairs(repairs, key_rows):
+    repairs = repairs[~repairs.key.isin(key_rows.keys())]
+    new = [dict(row, key = key) for key, rows in key_rows.items() for row in rows]
+    return pd.concat([repairs, pd.DataFrame(new, columns = repairs_cols)], ignore_index = True) if len(new) > 0 else repairs
+
+# =============================================================================
+# process partitions in a process pool
+# =============================================================================
+
+# process the partition of a device hour for approaches {approach: output_file} and write filtered events of each approach
+# returns a result per approach instead of raising:
+# [{'key', 'approach', 'ok', 'error', 'seconds', 'checksum', 'stat', 'rows', 'start', 'end', 'repairs'}]
+# repairs: orphan on/off events of each detector, [{'Parameter', 'OrphanOn', 'OrphanOff'}]
+def processPartition(key, store_path, device, date, hour, output_files, configs):
+    partition = store.partitionPath(store_path, device, date, hour)
+    try:
+        edf = readEvents(store_path, device, date, hour, {approach: configs[approach] for approach in output_files})
+    except Exception:
+        return [{'key': key, 'approach': approach, 'ok': False, 'error': traceback.format_exc(), 'seconds': 0}
+                for approach in output_files]
+    
+    results = []
+    for approach, output_file in output_files.items():
+        tic = time.time()
+        result = {'key': key, 'approach': approach, 'ok': False, 'error': ''}
+        try:
+            config = configs[approach]
+            
+            # merged (phase & actuation) data frames for through movement
+            mdf_thru, repairs = mergedEvents(partition, config, edf)
+            mdf_left = leftEvents(edf, config)
+            
+            fdf = filterEvents(mdf_thru, mdf_left, config)
+            frames.writeFrame(output_file, fdf)
+            
+            result.update(ok = True, checksum = manifest.fileChecksum(output_file), stat = manifest.fileStat(output_file),
+                          repairs = [{'Parameter': int(d), 'OrphanOn': int(n_on), 'OrphanOff': int(n_off)}
+                                     for d, n_on, n_off in zip(repairs['Parameter'], repairs['OrphanOn'], repairs['OrphanOff'])],
+                          **manifest.frameSummary(fdf))
+        except Exception:
+            result['error'] = traceback.format_exc()
+        
+        result['seconds'] = round(time.time() - tic, 3)
+        results.append(result)
+    
+    return results
+
+# process partitions of a device {key: (date, hour, {approach: output_file})} in num_workers processes
+# yields results of each partition as partitions complete; num_workers = 1 processes in this process
+def processPartitions(store_path, device, jobs, configs, num_workers = 4):
+    if num_workers == 1:
+        for key, (date, hour, output_files) in jobs.items():
+            yield processPartition(key, store_path, device, date, hour, output_files, configs)
+        return
+    
+    with ProcessPoolExecutor(max_workers = num_workers) as pool:
+        futures = [pool.submit(processPartition, key, store_path, device, date, hour, output_files, configs)
+                   for key, (date, hour, output_files) in jobs.items()]
+        for future in as_completed(futures):
+            yield future.result()
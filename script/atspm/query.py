@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+from atspm import store
+from atspm.timestamps import toEpoch, ms_hour
+
+# =============================================================================
+# time-range queries: binary search on sorted timestamps, zero-copy views
+# =============================================================================
+
+# bounds [lo, hi) of sorted timestamps within start, end
+# closed: 'both' includes start and end, 'neither' excludes them
+def bounds(ts, start = None, end = None, closed = 'both'):
+    ts = np.asarray(ts)
+    side = {'both': ('left', 'right'), 'neither': ('right', 'left')}[closed]
+    
+    lo = 0 if start is None else int(np.searchsorted(ts, toEpoch(start), side = side[0]))
+    hi = len(ts) if end is None else int(np.searchsorted(ts, toEpoch(end), side = side[1]))
+    return lo, max(lo, hi)
+
+# rows of a data frame sorted by timestamp within start, end (view of rows)
+def window(df, start = None, end = None, closed = 'both', col = 'TimeStamp'):
+    lo, hi = bounds(df[col].values, start, end, closed)
+    return df.iloc[lo:hi]
+
+# events of a device within [start, end] matching event ids and parameters: {column: array}
+# columns are views of the mmapped partition if the range falls in one partition and no ids are filtered
+def events(store_path, device, start = None, end = None, event_ids = None, params = None):
+    parts = [store.filterPartition(path, start, end, event_ids, params)
+             for date, hour, path in store.listPartitions(store_path, device, start, end)]
+    
+    if len(parts) == 0:
+        return {col: np.array([], dtype = dtype) for col, dtype in store.schema.items()}
+    if len(parts) == 1:
+        return parts[0]
+    return {col: np.concatenate([part[col] for part in parts]) for col in store.cols}
+
+# events of one hour partition of a device matching event ids and parameters: {column: array}
+def hourEvents(store_path, device, date, hour, event_ids = None, params = None):
+    start = store.partitionStart(date, hour)
+    return events(store_path, device, start, start + ms_hour - 1, event_ids, params)
+
+# data frame of queried events (copies only the queried rows)
+def frame(data):
+    return pd.DataFrame({col: np.asarray(values) for col, values in data.items()})
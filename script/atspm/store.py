@@ -0,0 +1,168 @@
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+from atspm.timestamps import toEpoch, dateKey, ms_day, ms_hour
+
+# =============================================================================
+# partitioned event store: store/device=<id>/date=<YYYYMMDD>/hour=<HH>/<column>.npy
+# =============================================================================
+
+# typed columns of event store
+schema = {'TimeStamp': 'int64', # epoch milliseconds
+          'EventID': 'uint8',
+          'Parameter': 'uint8'}
+cols = list(schema.keys())
+
+def partitionPath(store_path, device, date, hour):
+    return os.path.join(store_path, 'device=' + str(device), 'date=' + str(date), 'hour=' + str(hour).zfill(2))
+
+# partition key (date, hour) of epoch milliseconds
+def partitionKey(ts):
+    return dateKey(ts), int(ts % ms_day // ms_hour)
+
+# epoch milliseconds at start of partition
+def partitionStart(date, hour):
+    return toEpoch(pd.Timestamp(str(date))) + int(hour) * ms_hour
+
+# split rows into hour partitions in one pass: {(date, hour): data}
+def splitHours(data):
+    hours = data['TimeStamp'] // ms_hour
+    order = np.argsort(hours, kind = 'stable') # no-op reorder for sorted events
+    hours = hours[order]
+    
+    # boundaries of runs of equal hours
+    keys, starts = np.unique(hours, return_index = True)
+    ends = np.append(starts[1:], len(hours))
+    
+    parts = {}
+    for key, lo, hi in zip(keys, starts, ends):
+        rows = order[lo:hi]
+        parts[partitionKey(key * ms_hour)] = {col: np.asarray(values)[rows] for col, values in data.items()}
+    return parts
+
+# list partitions of a device, pruned to time range: [(date, hour, path)]
+def listPartitions(store_path, device, start = None, end = None):
+    device_path = os.path.join(store_path, 'device=' + str(device))
+    if not os.path.isdir(device_path):
+        return []
+    
+    # hour bounds of time range
+    lower = None if start is None else partitionKey(toEpoch(start) // ms_hour * ms_hour)
+    upper = None if end is None else partitionKey(toEpoch(end) // ms_hour * ms_hour)
+    
+    partitions = []
+    for date_dir in sorted(os.listdir(device_path)):
+        if not date_dir.startswith('date='):
+            continue
+        for hour_dir in sorted(os.listdir(os.path.join(device_path, date_dir))):
+            if not hour_dir.startswith('hour='):
+                continue
+            key = (date_dir[5:], int(hour_dir[5:]))
+            if (lower is not None and key < lower) or (upper is not None and key > upper):
+                continue
+            partitions.append(key + (os.path.join(device_path, date_dir, hour_dir),))
+    
+    return partitions
+
+# =============================================================================
+# write partitions
+# =============================================================================
+
+# write typed columns of a partition (sorted by timestamp)
+# artifacts derived from the partition (e.g. cycle tables) are removed
+def writePartition(path, data):
+    os.makedirs(path, exist_ok = True)
+    shutil.rmtree(os.path.join(path, '_cycles'), ignore_errors = True)
+    order = np.argsort(data['TimeStamp'], kind = 'stable')
+    for col in cols:
+        np.save(os.path.join(path, col + '.npy'), np.asarray(data[col], dtype = schema[col])[order])
+    return len(order)
+
+# write hour partitions of a device in one pass, skipping hours where exclude(date, hour)
+def writeHours(store_path, device, data, exclude = None, num_workers = 4):
+    parts = splitHours(data)
+    if exclude is not None:
+        parts = {key: part for key, part in parts.items() if not exclude(*key)}
+    
+    paths = [partitionPath(store_path, device, date, hour) for date, hour in parts.keys()]
+    with ThreadPoolExecutor(max_workers = num_workers) as pool:
+        rows = list(pool.map(writePartition, paths, parts.values()))
+    
+    return dict(zip(paths, rows))
+
+# append rows of a partition to the staged part of a source file
+# each source writes its own part, so concurrent workers never share a file
+def appendPart(path, source, data):
+    part_path = os.path.join(path, '_parts', source)
+    os.makedirs(part_path, exist_ok = True)
+    
+    for col in cols:
+        with open(os.path.join(part_path, col + '.bin'), 'ab') as f:
+            np.asarray(data[col], dtype = schema[col]).tofile(f)
+    
+    return None
+
+# merge staged parts with existing columns, sort by timestamp, write columns
+def finalizePartition(path):
+    parts_path = os.path.join(path, '_parts')
+    if not os.path.isdir(parts_path):
+        return None
+    
+    data = {col: [] for col in cols}
+    if os.path.exists(os.path.join(path, cols[0] + '.npy')):
+        for col, values in readPartition(path, mmap = False).items():
+            data[col].append(values)
+    
+    for source in sorted(os.listdir(parts_path)):
+        for col in cols:
+            data[col].append(np.fromfile(os.path.join(parts_path, source, col + '.bin'), dtype = schema[col]))
+    
+    rows = writePartition(path, {col: np.concatenate(values) for col, values in data.items()})
+    shutil.rmtree(parts_path)
+    
+    return rows
+
+# =============================================================================
+# read partitions with filters pushed down to typed columns
+# =============================================================================
+
+# read typed columns of a partition
+def readPartition(path, mmap = True):
+    mode = 'r' if mmap else None
+    return {col: np.load(os.path.join(path, col + '.npy'), mmap_mode = mode) for col in cols}
+
+# read rows of one partition within [start, end] matching event ids and parameters
+def filterPartition(path, start = None, end = None, event_ids = None, params = None):
+    data = readPartition(path)
+    ts = data['TimeStamp']
+    
+    # timestamps are sorted, so the time range is a contiguous slice
+    lo = 0 if start is None else np.searchsorted(ts, toEpoch(start), side = 'left')
+    hi = len(ts) if end is None else np.searchsorted(ts, toEpoch(end), side = 'right')
+    data = {col: values[lo:hi] for col, values in data.items()}
+    
+    # without id filters the slice is returned as views of the mmapped columns
+    if event_ids is None and params is None:
+        return data
+    
+    mask = np.ones(hi - lo, dtype = bool)
+    if event_ids is not None:
+        mask &= np.isin(data['EventID'], list(event_ids))
+    if params is not None:
+        mask &= np.isin(data['Parameter'], list(params))
+    
+    return {col: values[mask] for col, values in data.items()}
+
+# read events of partitions as data frame
+def readEvents(paths, start = None, end = None, event_ids = None, params = None):
+    if isinstance(paths, str):
+        paths = [paths]
+    
+    data = [filterPartition(path, start, end, event_ids, params) for path in paths]
+    if len(data) == 0:
+        return pd.DataFrame({col: np.array([], dtype = schema[col]) for col in cols})
+    
+    return pd.DataFrame({col: np.concatenate([part[col] for part in data]) for col in cols})
@@ -0,0 +1,121 @@
+import itertools
+import numpy as np
+import pandas as pd
+
+from atspm import query, cycles, actuations
+
+# =============================================================================
+# streaming event processor: cycle, SCA and OHG parameters of actuations over a
+# continuous event stream in time order (e.g. consecutive hourly partitions)
+# the open cycle and open actuations are carried across chunks, so actuations
+# straddling chunk boundaries are processed as in one pass over the whole stream
+# =============================================================================
+
+on, off = actuations.on, actuations.off
+
+# latest timestamp
+ts_max = np.iinfo('int64').max
+
+# events of a phase (indication starts) and of detectors (on/off) in a chunk
+def selectEvents(chunk, phase, detectors):
+    is_phase = (chunk.Parameter == phase) & chunk.EventID.isin(cycles.start_events)
+    is_det = chunk.EventID.isin([on, off]) & chunk.Parameter.isin(detectors)
+    return chunk[is_phase | is_det]
+
+# columns of processed actuations
+frame_cols = ['TimeStamp', 'Parameter', 'CycleNum', 'AIY', 'TUY', 'TUG'] + actuations.ohg_cols
+
+# no processed actuations, typed as processed actuations (see atspm/actuations.py)
+def emptyFrame():
+    return pd.DataFrame({col: pd.Series(dtype = actuations.schema[col]) for col in frame_cols})
+
+# last complete actuation of each detector (detection on before its last detection off): {detector: timestamp}
+def lastActuation(ddf):
+    last_off = ddf.Parameter.map(ddf[ddf.EventID == off].groupby('Parameter').TimeStamp.max())
+    return ddf[(ddf.EventID == on) & (ddf.TimeStamp <= last_off)].groupby('Parameter').TimeStamp.max().to_dict()
+
+# process chunks of events (data frames of TimeStamp, EventID, Parameter sorted by timestamp)
+# yields (actuations, watermark) after each chunk: detection on events processed so far and a
+# timestamp before which every detection on has been emitted
+# an actuation is emitted once its cycle is complete and the next actuation over its detector
+# is known; without a next actuation within max_lead (ms), leading headway and gap are left empty
+# actuations before the first indication start and in the open cycle at the end are dropped
+def processStream(chunks, phase, detectors, max_lead = 900000):
+    carry = None # events carried to next chunk
+    started = False # indication start seen
+    last_emitted = {} # last emitted detection on of each detector: {detector: timestamp}
+    cycle_base = 0 # cycles completed before first yellow start of carried events
+    
+    for chunk in itertools.chain(chunks, [None]):
+        final = chunk is None
+        if final and carry is None:
+            yield emptyFrame(), ts_max
+            continue
+        
+        buf = carry if final else selectEvents(chunk, phase, detectors)
+        if not final and carry is not None:
+            buf = pd.concat([carry, buf], ignore_index = True)
+        is_phase = (buf.Parameter.values == phase) & np.isin(buf.EventID.values, cycles.start_events)
+        
+        # signal is unknown before first indication start of stream
+        if not started:
+            if not is_phase.any():
+                yield emptyFrame(), (buf.TimeStamp.values[-1] + 1 if len(buf) > 0 else 0)
+                continue
+            keep = buf.TimeStamp.values >= buf.TimeStamp.values[is_phase][0]
+            buf, is_phase, started = buf[keep], is_phase[keep], True
+        
+        pdf, ddf = buf[is_phase], buf[~is_phase]
+        Y = pdf.TimeStamp.values[pdf.EventID.values == cycles.pse['Ys']]
+        
+        # detection on events not yet emitted
+        t = ddf.TimeStamp.values
+        is_new = (ddf.EventID.values == on) & (t > ddf.Parameter.map(last_emitted).fillna(-1).values)
+        
+        # complete cycles end at start of the open cycle
+        if len(Y) < 2:
+            carry = buf
+            yield emptyFrame(), (ts_max if final else t[is_new].min() if is_new.any() else buf.TimeStamp.values[-1] + 1)
+            continue
+        H = Y[-1]
+        
+        # cycle and signal of on/off actuations (see atspm/cycles.py), SCA and OHG parameters (see atspm/actuations.py)
+        table = {'pdf': pdf, 'cdf': cycles.cycleFrame(cycles.startTimes(query.window(pdf, Y[0], H)))}
+        state = cycles.asOf(table, ddf.TimeStamp.values)
+        sca_ohg = actuations.scaOHG(ddf.TimeStamp.values, ddf.EventID.values, ddf.Parameter.values, state['Signal'], detectors)
+        
+        mdf = ddf.assign(CycleNum = state['CycleNum'] + cycle_base, AIY = state['AIY'], TUY = state['TUY'], TUG = state['TUG'],
+                         **actuations.toColumns(sca_ohg, len(ddf)))
+        
+        # detection on events within complete cycles
+        ready = is_new & (t < H)
+        if not final:
+            # wait for next complete actuation over detector, unless none within max_lead
+            is_waiting = t >= ddf.Parameter.map(lastActuation(ddf)).fillna(-1).values
+            ready &= ~is_waiting | (t < buf.TimeStamp.values[-1] - max_lead)
+        
+        emitted = mdf[ready]
+        last_emitted.update(emitted.groupby('Parameter').TimeStamp.max().to_dict())
+        emitted = emitted.drop('EventID', axis = 1).dropna(subset = ['SCA'])
+        
+        if final:
+            yield emitted, ts_max
+            continue
+        
+        # carry indication starts from the cycle of the first pending actuation (at latest the open cycle)
+        # and from the indication in effect at the first pending actuation
+        pending = is_new & ~ready
+        first_pending = min(H, t[pending].min()) if pending.any() else H
+        j = max(np.searchsorted(Y, first_pending, side = 'right') - 1, 0)
+        k = max(np.searchsorted(pdf.TimeStamp.values, first_pending, side = 'right') - 1, 0)
+        keep_phase = pdf.TimeStamp.values >= min(Y[j], pdf.TimeStamp.values[k])
+        
+        # carry actuations of each detector from its last emitted detection on (for following headway, gap)
+        first_new = ddf[pending].groupby('Parameter').TimeStamp.min().to_dict()
+        carry_from = {d: last_emitted.get(d, first_new.get(d, ts_max)) for d in detectors}
+        keep_det = t >= ddf.Parameter.map(carry_from).fillna(ts_max).values
+        
+        carry = pd.concat([pdf[keep_phase], ddf[keep_det]]).sort_values(by = 'TimeStamp', kind = 'stable')
+        cycle_base += j
+        
+        yield emitted, (t[pending].min() if pending.any() else buf.TimeStamp.values[-1] + 1)
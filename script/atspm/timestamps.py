@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+# timestamp format of controller event logs
+raw_format = '%m-%d-%Y %H:%M:%S.%f'
+
+# milliseconds per day, hour
+ms_day = 86400000
+ms_hour = 3600000
+
+# parse text timestamps to int64 epoch milliseconds
+def parseTimeStamp(x, fmt = raw_format):
+    ts = pd.to_datetime(x, format = fmt)
+    return np.asarray(ts.values.astype('datetime64[ms]').view('int64'))
+
+# date key (YYYYMMDD) of epoch milliseconds
+def dateKey(ts):
+    return str(np.datetime64(int(ts), 'ms').astype('datetime64[D]')).replace('-', '')
+
+# epoch milliseconds of an int, datetime, or timestamp string
+def toEpoch(x):
+    if isinstance(x, (int, np.integer)):
+        return int(x)
+    return pd.Timestamp(x).value // 10**6
+
+# int64 epoch milliseconds to datetime, for presentation only
+def toDatetime(ts):
+    return pd.to_datetime(ts, unit = 'ms')
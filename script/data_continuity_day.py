@@ -1,28 +1,30 @@
 import os
-import pandas as pd
+import sys
 from datetime import datetime
 
+sys.path.append(r"D:\GitHub\dilemma_zone\script")
+from atspm import compact, query
+from atspm.timestamps import toDatetime, toEpoch, ms_day
+
 import plotly.express as px
 import plotly.io as pio
 pio.renderers.default = 'browser'
 
 os.chdir(r"D:\SynologyDrive\Data\High Resolution Events Data\Indian School")
 
-# read file
+# device shards of compact event records of month file (converted once from text)
 year, month = 2023, 3
 file = str(year) + '_' + str(month).zfill(2)
-df = pd.read_csv(file + "_ISR_19Ave.txt", sep = '\t')
+if not os.path.exists(file + "_ISR_19Ave_compact"):
+    compact.fromText(file + "_ISR_19Ave.txt", file + "_ISR_19Ave_compact")
 
-# filter intersection, convert timestamp
+# open only the intersection shard, slice day (timestamps in epoch milliseconds)
 ID = 46
-df = df[df.DeviceID == ID]
-df.drop('DeviceID', axis = 1, inplace = True)
-df.TimeStamp = pd.to_datetime(df.TimeStamp, format = '%m-%d-%Y %H:%M:%S.%f')
-df = df[df.TimeStamp.dt.month == month]
-
-# filter day
 day = 27
-df = df[df.TimeStamp.dt.day == day]
+events = compact.openShard(file + "_ISR_19Ave_compact", ID)
+day_start = toEpoch(datetime(year, month, day))
+df = compact.toFrame(compact.sliceEvents(events, start = day_start, end = day_start + ms_day - 1))
+df.drop('DeviceID', axis = 1, inplace = True)
 
 # detector configuration for wb
 det = {'adv': (27, 28, 29), 
@@ -34,6 +36,7 @@ det_set = det['adv'] + det['stop'] + det['left']
 fdf = df.copy(deep = True)
 fdf = fdf[(df.EventID == 82) & (df.Parameter.isin(det_set))]
 fdf.Parameter = fdf.Parameter.astype(str)
+fdf.TimeStamp = toDatetime(fdf.TimeStamp)
 
 # plot data continuity for whole dataset
 det_order = {'Parameter': sorted(det)}
@@ -50,7 +53,7 @@ fig.write_html(output_fig)
 # filter timestamp for data subset
 start = datetime(year, month, day, 14, 15)
 end = datetime(year, month, day, 18, 45)
-sdf = df[(df.TimeStamp >= start) & (df.TimeStamp <= end)]
+sdf = query.window(df, start, end)
 
 output_period = str(start.hour).zfill(2) + str(start.minute).zfill(2) + '_' + str(end.hour).zfill(2) + str(end.minute).zfill(2)
 
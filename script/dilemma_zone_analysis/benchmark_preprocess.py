@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+import shutil
+
+os.chdir(r"D:\GitHub\dilemma_zone")
+sys.path.append(r"D:\GitHub\dilemma_zone\script")
+from atspm import store, query, compact
+from atspm.timestamps import toDatetime
+
+# =============================================================================
+# benchmark: nested month-day-hour loop vs single-pass partitioner for a full month
+# =============================================================================
+
+events_path = r"D:\SynologyDrive\Data\High Resolution Events Data\Indian School"
+file = '2023_01_ISR_19Ave'
+device = 46
+output_path = "ignore/benchmark"
+
+# read events of 19th Ave for January
+events = compact.openShard(os.path.join(events_path, file + '_compact'), device)
+df = compact.toFrame(events)
+df.drop('DeviceID', axis = 1, inplace = True)
+
+dt = toDatetime(df.TimeStamp).dt
+df['month'] = dt.month
+df['day'] = dt.day
+df['hour'] = dt.hour
+df = df[df.month == 1]
+
+# previous partitioner: deep copy and boolean mask at each of month, day, hour
+def nestedLoop(path):
+    for month in list(df.month.unique()):
+        mdf = df.copy(deep = True)
+        mdf = mdf[mdf.month == month]
+
+        for day in list(mdf.day.unique()):
+            ddf = mdf.copy(deep = True)[mdf.day == day]
+
+            for hour in list(ddf.hour.unique()):
+                hdf = ddf.copy(deep = True)[ddf.hour == hour]
+                date = '2023' + str(month).zfill(2) + str(day).zfill(2)
+
+                hdf.drop(['month', 'day', 'hour'], axis = 1, inplace = True)
+                store.writePartition(store.partitionPath(path, device, date, hour), hdf)
+    return None
+
+# single-pass partitioner as in preprocess_data.py: group by (date, hour) once, write in a thread pool
+def singlePass(path):
+    store.writeHours(path, device, {col: df[col].values for col in store.cols}, num_workers = 8)
+    return None
+
+result = {}
+for name, func in [('nested', nestedLoop), ('single', singlePass)]:
+    path = os.path.join(output_path, name)
+    shutil.rmtree(path, ignore_errors = True)
+
+    start = time.perf_counter()
+    func(path)
+    result[name] = time.perf_counter() - start
+
+# check both partitioners write the same partitions and rows
+for (date, hour, path_nested), (_, _, path_single) in zip(store.listPartitions(os.path.join(output_path, 'nested'), device),
+                                                          store.listPartitions(os.path.join(output_path, 'single'), device)):
+    nested = query.frame(query.hourEvents(os.path.join(output_path, 'nested'), device, date, hour))
+    single = query.frame(query.hourEvents(os.path.join(output_path, 'single'), device, date, hour))
+    assert nested.equals(single), (date, hour)
+
+print("Events: ", len(df))
+print("Nested loop (s): ", round(result['nested'], 2))
+print("Single pass (s): ", round(result['single'], 2))
+print("Speedup: ", round(result['nested'] / result['single'], 1))
@@ -0,0 +1,94 @@
+import os
+import sys
+import shutil
+import numpy as np
+import pandas as pd
+
+os.chdir(r"D:\GitHub\dilemma_zone")
+sys.path.append(r"D:\GitHub\dilemma_zone\script")
+from atspm import store, process, actuations, matchers, online, frames
+from atspm.timestamps import ms_hour
+
+# =============================================================================
+# check: online matcher (see atspm/online.py) against the batch matcher on the same actuations
+# synthetic processed actuations of an hour: vehicles of each lane over adv det, then stop-bar det,
+# or rear det of the left-turn lane; identical matches if windows of adv actuations do not overlap,
+# share of batch matches kept online on dense traffic
+# =============================================================================
+
+output_path = "ignore/check_match_stream"
+lanes = {27: 0, 28: 1, 29: 2} # adv det of each lane
+stop_det = {0: 9, 1: 10, 2: 11}
+rear_det = 6
+
+# as in match_events_stream.py
+matcher = matchers.proposedMatcher(3, 11, 6.6, 4.6, left = matchers.leftMatcher(4, 7, 5.4, lane = max(lanes.values())))
+assign_method = 'greedy'
+
+# processed actuations of an hour: headways of vehicles (s) of each lane uniform in [min_headway, max_headway],
+# travel times uniform in thru and left-turn windows, a third of vehicles of the left-turn lane turn left
+def hourActuations(start, min_headway, max_headway, seed = 0):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for adv, lane in lanes.items():
+        t = start + np.cumsum(rng.uniform(min_headway, max_headway, int(3600 / min_headway)) * 1000).astype('int64')
+        t = t[t < start + ms_hour - 12000]
+        left = (lane == max(lanes.values())) & (rng.random(len(t)) < 1/3)
+        target_ts = t + np.where(left, rng.uniform(4.2, 6.8, len(t)), rng.uniform(3.5, 10.5, len(t))) * 1000
+
+        rows.append(pd.DataFrame({'TimeStamp': t, 'Parameter': adv, 'Lane': lane, 'Det': 'adv', 'SCA': 'GG'}))
+        rows.append(pd.DataFrame({'TimeStamp': target_ts.astype('int64'),
+                                  'Parameter': np.where(left, rear_det, stop_det[lane]),
+                                  'Lane': np.where(left, -1, lane),
+                                  'Det': np.where(left, 'rear', 'stop'),
+                                  'SCA': rng.choice(['GG', 'RG'], len(t))}))
+
+    df = pd.concat(rows, ignore_index = True).sort_values(by = 'TimeStamp', kind = 'stable').reset_index(drop = True)
+    df = df.assign(**{col: np.nan for col in process.thru_cols if col not in df.columns})
+    df['OccTime'] = 0.5
+    df['ID'] = df.index + 100000
+    return actuations.compact(df[process.thru_cols + ['ID']])
+
+# pairs of matches of a stage: {(adv id, target id)}
+def batchPairs(df):
+    matches = matchers.matchEvents(df, matcher, assign_method)
+    return {'thru': {(adv_id, stop_id) for stop_id, adv_id in matches['thru'].items()},
+            'left': set(matches['left'].items())}
+
+def onlinePairs(file, key):
+    result = pd.concat([matches for matches, watermark, stats in
+                        online.matchStream(online.replayFiles([file], 1000), matcher, assign_method)], ignore_index = True)
+
+    # one-to-one within each stage, ids with the hour key of their file
+    for stage, sdf in result.groupby('stage'):
+        assert not sdf.adv_id.duplicated().any() and not sdf.target_id.duplicated().any(), stage
+    assert (result.adv_hour == key).all() and (result.target_hour == key).all(), key
+
+    return {stage: set(zip(result[result.stage == stage].adv_id, result[result.stage == stage].target_id)) for stage in ['thru', 'left']}
+
+shutil.rmtree(output_path, ignore_errors = True)
+os.makedirs(output_path)
+
+# sparse traffic: 20 to 40 s headways; dense traffic: 1.5 to 6 s headways, several adv actuations of a lane in each window
+date, hour = '20230110', 5
+key = date + '_' + str(hour).zfill(2)
+result = {}
+for name, min_headway, max_headway in [('sparse', 20, 40), ('dense', 1.5, 6)]:
+    df = hourActuations(store.partitionStart(date, hour), min_headway, max_headway)
+    os.makedirs(os.path.join(output_path, name))
+    file = os.path.join(output_path, name, key + "_filtered.npz")
+    frames.writeFrame(file, df)
+
+    batch, stream = batchPairs(df), onlinePairs(file, key)
+    for stage in ['thru', 'left']:
+        common = len(batch[stage] & stream[stage])
+        result[(name, stage)] = common / max(len(batch[stage]), 1)
+        print(name, stage, "matches batch, online, common: ", len(batch[stage]), len(stream[stage]), common)
+
+    # exact on sparse traffic, most batch matches kept on dense traffic (left-turn stage exact in both)
+    if name == 'sparse':
+        assert batch == stream, name
+    else:
+        assert batch['left'] == stream['left'] and result[(name, 'thru')] > 0.95, result
+
+print("Share of batch matches kept online: ", {key: round(value, 3) for key, value in result.items()})
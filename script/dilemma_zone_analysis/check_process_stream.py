@@ -0,0 +1,86 @@
+import os
+import sys
+import shutil
+import numpy as np
+import pandas as pd
+
+os.chdir(r"D:\GitHub\dilemma_zone")
+sys.path.append(r"D:\GitHub\dilemma_zone\script")
+from atspm import store, stream, cycles, process, actuations, frames
+from atspm.timestamps import ms_hour
+
+# =============================================================================
+# check: hours without actuations in a run processed by process_events_stream.py
+# synthetic events of an approach: cycles in every hour, actuations only in the last hour,
+# so the first hours are complete before any actuation is emitted
+# =============================================================================
+
+output_path = "ignore/check_stream"
+on, off = stream.on, stream.off
+
+config = {'phase': {'thru': 2, 'left': 5},
+          'det': {'adv': (27, 28, 29), 'stop': (9, 10, 11), 'front': 5, 'rear': 6},
+          'lane': {'adv': {27: 0, 28: 1, 29: 2}, 'stop': {9: 0, 10: 1, 11: 2}},
+          'crit': {'TUY_adv': 6, 'AIY_adv': 3.6, 'TUY_stop': 1.5, 'AIY_stop': 12}}
+thru_det_set = process.thruDetectors(config)
+
+# events of an hour: cycles of 90 s starting on yellow (4 s yellow, 2 s red), actuations of 1 s every 20 s if active
+def hourEvents(start, active):
+    t = start + np.arange(0, ms_hour, 90000)
+    events = [(t, cycles.pse['Ys']), (t + 4000, cycles.pse['Rs']), (t + 6000, cycles.pse['Gs'])]
+    df = pd.concat([pd.DataFrame({'TimeStamp': ts, 'EventID': event_id, 'Parameter': config['phase']['thru']})
+                    for ts, event_id in events])
+
+    if active:
+        for i, det in enumerate(thru_det_set + (config['det']['rear'],)):
+            t = start + 500 * i + np.arange(0, ms_hour - 2000, 20000)
+            df = pd.concat([df, pd.DataFrame({'TimeStamp': t, 'EventID': on, 'Parameter': det}),
+                            pd.DataFrame({'TimeStamp': t + 1000, 'EventID': off, 'Parameter': det})])
+
+    return df.astype({'TimeStamp': 'int64', 'EventID': 'uint8', 'Parameter': 'uint8'}).sort_values(by = 'TimeStamp', kind = 'stable').reset_index(drop = True)
+
+# two quiet hours, then an active hour
+date = '20230110'
+run = [(hour, store.partitionStart(date, hour), hour == 7) for hour in [5, 6, 7]]
+chunks = {start: hourEvents(start, active) for hour, start, active in run}
+
+# =============================================================================
+# process as in process_events_stream.py
+# =============================================================================
+
+shutil.rmtree(output_path, ignore_errors = True)
+os.makedirs(output_path)
+
+def writeHour(file, mdf_thru, mdf_left):
+    mdf_thru = process.addLaneDet(mdf_thru, config)[process.thru_cols]
+    fdf = process.filterEvents(mdf_thru, mdf_left, config)
+    frames.writeFrame(os.path.join(output_path, file + "_filtered.npz"), fdf)
+    return len(fdf)
+
+left_events, emitted, rows = {}, [], {}
+def readChunks():
+    for hour, start, active in run:
+        left_events[start] = process.leftEvents(chunks[start], config)
+        yield chunks[start]
+
+for mdf, watermark in stream.processStream(readChunks(), config['phase']['thru'], thru_det_set):
+    if len(mdf) > 0:
+        emitted.append(mdf)
+
+    complete = [start for start in left_events if start + ms_hour <= watermark]
+    if len(complete) == 0:
+        continue
+
+    mdf = pd.concat(emitted, ignore_index = True) if len(emitted) > 0 else stream.emptyFrame()
+    hours = mdf.TimeStamp.astype('int64') // ms_hour * ms_hour
+    for start in sorted(complete):
+        rows[start] = writeHour(str(start), mdf[hours == start].sort_values(by = 'TimeStamp').reset_index(drop = True), left_events.pop(start))
+    emitted = [mdf[~hours.isin(complete)]]
+
+# every hour written: quiet hours empty, with the schema of the active hour
+files = {start: actuations.readActuations(os.path.join(output_path, str(start) + "_filtered.npz")) for hour, start, active in run}
+for hour, start, active in run:
+    assert (rows[start] > 0) == active, (hour, rows[start])
+    assert files[start].dtypes.equals(files[run[-1][1]].dtypes), hour
+
+print("Rows of hours: ", {hour: rows[start] for hour, start, active in run})
@@ -1,19 +1,16 @@
 import os
-import pandas as pd
+import sys
 import json
 
 os.chdir(r"D:\GitHub\dilemma_zone")
-input_path = "ignore/dz_data/processed"
+sys.path.append(r"D:\GitHub\dilemma_zone\script")
+from atspm import manifest, actuations, matchers, intersections
+
+input_path = "ignore/dz_data/processed" # processed events of each approach in <input_path>/<approach> (see process_events_bulk.py)
+result_path = "data/dz_analysis/match_results.txt" # {approach: {file: {stop id: adv id}}}
+config_file = "script/config/intersections.json"
+device = 46
 
-# define class to subtract timestamps
-class Vector():
-    def __init__(self, data):
-        self.data = data
-    def __repr__(self):
-        return repr(self.data)
-    def __sub__(self, other):
-        return list((a-b).total_seconds() for a, b in zip(self.data, other.data))
-    
 # detector length & spacing parameters
 len_stop = 40 # length of stop-bar det
 len_adv = 5 # length of advance det
@@ -33,187 +30,74 @@ tt_left_min = 4
 tt_left_max = 7
 tt_left_ideal = 5.4
 
-# =============================================================================
-# function to process candidate match pairs
-# =============================================================================
+# assignment of candidate pairs to matches: 'sequential' as in published results, or one-to-one 'greedy' or 'optimal' (see atspm/matching.py)
+assign_method = 'sequential'
 
-def processCandidateMatches(match_initial):    
-    # convert list of nested dictionaries to flat list
-    match_flat = []
-    for candidate in match_initial:
-        for key, value in candidate.items():
-            match_flat.append({key: value})
-            
-    match_final = {}
-    seen_target_id, seen_adv_id = [], []
-    seen_match_strength_target, seen_match_strength_adv = {}, {}
-    
-    # function to update match pairs based on highest matching strength
-    def updateMatchPairs():
-        match_final[current_target_id] = list([current_adv_id, current_match_strength])
-        seen_match_strength_target[current_target_id] = current_match_strength
-        seen_match_strength_adv[current_adv_id] = current_match_strength
-        return None
-        
-    for item in match_flat:
-        key = list(item.keys())
-        value = list(item.values())[0]
-        
-        current_target_id = key[0]
-        current_adv_id = value[0]
-        current_match_strength = value[1]
-        
-        if current_target_id not in seen_target_id:
-            if current_adv_id not in seen_adv_id:
-                seen_target_id.append(current_target_id)
-                seen_adv_id.append(current_adv_id)
-                updateMatchPairs()
-            else: # current adv id already seen
-                seen_match_strength = seen_match_strength_adv[current_adv_id]
-                if current_match_strength > seen_match_strength:
-                    updateMatchPairs()
-        else: # current target id already seen
-            if current_adv_id not in seen_adv_id:
-                seen_match_strength = seen_match_strength_target[current_target_id]
-                if current_match_strength > seen_match_strength:
-                    updateMatchPairs()
-            else: # current target id and current adv id both seen
-                # look for greater matching strength out of adv and target
-                seen_match_strength = max(seen_match_strength_target[current_target_id],
-                                          seen_match_strength_adv[current_adv_id])
-                if current_match_strength > seen_match_strength:
-                    updateMatchPairs()
-                    
-    return match_final
+# phase, detector and lane configuration of each approach (see atspm/intersections.py)
+approaches = intersections.approaches(config_file, device)
 
 # =============================================================================
-# sets of data frames and actuation ids
+# match events of each approach in bulk
 # =============================================================================
 
-def matchAcutuationEvents():
-    cdf = df.copy(deep = True) # copied df
+# match results of previous run
+results = {}
+if os.path.exists(result_path):
+    with open(result_path) as f:
+        results = json.load(f)
+
+for approach, config in approaches.items():
+    approach_path = os.path.join(input_path, approach)
+    if not os.path.isdir(approach_path):
+        continue
     
-    # data frames for adv, stop, left-turn
-    adf = cdf[cdf.Det == 'adv']
-    sdf = cdf[cdf.Det == 'stop']
-    ldf = cdf[cdf.Det == 'rear']
+    # proposed algorithm: adv actuations over the leftmost lane (lanes numbered from the right)
+    # matched to left-turn rear det first (see atspm/matchers.py)
+    left_lane = max(config['lane']['adv'].values())
+    matcher = matchers.proposedMatcher(tt_thru_min, tt_thru_max, tt_thru_ideal_stop, tt_thru_ideal_run,
+                                       left = matchers.leftMatcher(tt_left_min, tt_left_max, tt_left_ideal, lane = left_lane))
     
-    # actuation IDs
-    set_id_adv = set(sorted(adf.ID))
-    set_id_stop = set(sorted(sdf.ID))
-    set_id_rear = set(sorted(ldf.ID))
-    set_id_adv_left = set(sorted(adf[adf.Lane == 2].ID))
+    # parameters of match results: results of processed files are rematched if any of them changes
+    params = {'tt_thru': [tt_thru_min, tt_thru_max, tt_thru_ideal_stop, tt_thru_ideal_run],
+              'tt_left': [tt_left_min, tt_left_max, tt_left_ideal],
+              'left_lane': left_lane,
+              'assign': assign_method}
     
-    # =========================================================================
-    # function to match events: adv det to left-turn rear det
-    # =========================================================================
+    # list of processed files
+    file_list = sorted(file for file in os.listdir(approach_path) if file.endswith("_filtered.npz"))
     
-    left_match_initial = [] # initial candidate match pairs of adv to left-turn
+    # manifest of processed files and match results (see atspm/manifest.py)
+    outputs = manifest.readManifest(approach_path)
     
-    for i in set_id_adv_left:
-        adv_time = adf[adf.ID == i].TimeStamp
+    # results of removed files are dropped
+    result = {file: pairs for file, pairs in results.get(approach, {}).items() if file in file_list}
     
-        left_candidate = {}        
-        for k in set_id_rear:
-            left_time = ldf[ldf.ID == k].TimeStamp
-            
-            if left_time.values[0] > adv_time.values[0]: # look forward in timestamp
-                tt_adv_left = (Vector(left_time) - Vector(adv_time)).pop() # travel time from adv to rear
-                
-                if tt_adv_left < tt_left_min or tt_adv_left > tt_left_max:
-                    pass
-                else:
-                    diff_tt_left = abs(tt_adv_left - tt_left_ideal)
-                    
-                    if diff_tt_left == 0: diff_tt_left = 0.1 # avoid zero division error
-                    
-                    left_match_strength = round(1/diff_tt_left, 2)
-                    left_candidate[k] = list([i, left_match_strength])
+    # match events for each new or changed file
+    for file in file_list:
+        # results depend on the processed file and the parameters of the matcher
+        upstream = manifest.upstreamOf({file: manifest.fileChecksumOf(outputs, file, os.path.join(approach_path, file)),
+                                        'params': manifest.dataChecksum(params)})
+        if file in result and manifest.isCurrent(outputs, 'match/' + file, upstream):
+            continue
         
-        # print(i, ":", left_candidate)
-        if len(left_candidate) != 0: # consider only non-empty candidate matches
-            left_match_initial.append(left_candidate)
-            
-    left_match_final = processCandidateMatches(left_match_initial)
-
-    # final match of adv & left id pairs
-    left_match_pairs = {}
-    for key, value in left_match_final.items():
-        left_match_pairs[value[0]] = key
-     
-    # =========================================================================
-    # analysis of adv-stop match pairs
-    # =========================================================================
-
-    # set of seen/unseen acutation ids at adv det
-    seen_adv_id = set(left_match_pairs.keys())
-    set_id_adv_look = set_id_adv - seen_adv_id
-    
-    thru_match_initial = [] # initial candidate match pairs of adv to left-turn
-
-    for i in set_id_adv_look:
-        adv_time = adf[adf.ID == i].TimeStamp
-        adv_lane = adf[adf.ID == i].Lane.values[0].astype(int)
-        set_id_stop_look = set(sdf[sdf.Lane == adv_lane].ID)
+        print("**************************************************")
+        print("Processing events for file: ", approach, file, "\n")
+        
+        # read data with coded columns (see atspm/actuations.py)
+        df = actuations.readActuations(os.path.join(approach_path, file))
+        
+        result[file] = matchers.matchEvents(df, matcher, assign_method)['thru'] # {stop id: adv id}
+        outputs = manifest.record(outputs, 'match/' + file, 'match', manifest.dataChecksum(result[file]),
+                                  rows = len(result[file]), upstream = upstream)
     
-        thru_candidate = {}
-        for j in set_id_stop_look:        
-            stop_time = sdf[sdf.ID == j].TimeStamp
-            
-            if stop_time.values[0] > adv_time.values[0]: # look forward in timestamp
-                stop_sca = sdf[sdf.ID == j].SCA.values[0]
-                tt_adv_stop = (Vector(stop_time) - Vector(adv_time)).pop() # travel time from adv to stop-bar
-                
-                if tt_adv_stop < tt_thru_min or tt_adv_stop > tt_thru_max:
-                    pass
-                else:
-                    if stop_sca == 'RG': # if vehicle stops at stop bar
-                        diff_tt_thru = abs(tt_adv_stop - tt_thru_ideal_stop)
-                    else: # if vehicle runs over stop bar
-                        diff_tt_thru = abs(tt_adv_stop - tt_thru_ideal_run)
-                    
-                    if diff_tt_thru == 0: diff_tt_thru = 0.1 # avoid zero division error
-                    
-                    thru_match_strength = round(1/diff_tt_thru, 2)
-                    thru_candidate[j] = list([i, thru_match_strength])
-                    
-        # print(i, ":", thru_candidate)
-        if len(thru_candidate) != 0: # consider only non-empty candidate matches
-            thru_match_initial.append(thru_candidate)
-
-    thru_match_final = processCandidateMatches(thru_match_initial)
-
-    # final match of adv & stop-bar id pairs
-    thru_match_pairs = {}
-    for key, value in thru_match_final.items():
-        thru_match_pairs[key] = value[0]
-    thru_match_pairs = dict(sorted(thru_match_pairs.items()))
+    results[approach] = dict(sorted(result.items()))
     
-    return thru_match_pairs
-
-# =============================================================================
-# match events in bulk
-# =============================================================================
-
-# list of raw files
-file_list = os.listdir(input_path)
-
-result = {}
+    # drop manifest entries of match results of removed files
+    stale = [key for key in outputs[outputs.kind == 'match'].index if key[len('match/'):] not in result]
+    manifest.writeManifest(approach_path, manifest.drop(outputs, stale))
 
-# match events for each file
-for file in file_list:
-    print("**************************************************")
-    print("Processing events for file: ", file, "\n")
-    
-    # read data
-    df = pd.read_csv(os.path.join(input_path, file), sep = '\t')
-    df.TimeStamp = pd.to_datetime(df.TimeStamp, format = '%Y-%m-%d %H:%M:%S.%f').sort_values()
-    
-    result[file] = matchAcutuationEvents()
+# results of approaches no longer configured are dropped
+results = {approach: results[approach] for approach in sorted(results) if approach in approaches}
 
-match_count = 0    
-for value in result.values():
-    match_count += len(value)
-    
-with open("data/dz_analysis/match_results.txt", 'w') as f:
-    json.dump(result, f)
+with open(result_path, 'w') as f:
+    json.dump(results, f)
@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+os.chdir(r"D:\GitHub\dilemma_zone")
+sys.path.append(r"D:\GitHub\dilemma_zone\script")
+from atspm import matchers, online, intersections
+
+input_path = "ignore/dz_data/processed" # processed events of each approach in <input_path>/<approach> (see process_events_bulk.py)
+result_path = "data/dz_analysis/match_results_stream.txt" # ids of processed files with the hour key of their file (see atspm/online.py)
+config_file = "script/config/intersections.json"
+device = 46
+
+# =============================================================================
+# online alternative to match_events_bulk.py: processed files are replayed as one
+# stream of actuations in time order and matched as the stream goes (see atspm/online.py)
+# =============================================================================
+
+# empirical min, max of through travel time
+tt_thru_min = 3
+tt_thru_max = 11
+
+# empirical travel time to stop/run over stop-bar det
+tt_thru_ideal_stop = 6.6
+tt_thru_ideal_run = 4.6
+
+# empirical min, max, ideal left-turn travel time (from adv det to left-turn lane rear det)
+tt_left_min = 4
+tt_left_max = 7
+tt_left_ideal = 5.4
+
+# assignment of candidate pairs to one-to-one matches: 'greedy' or 'optimal' (see atspm/matching.py)
+assign_method = 'greedy'
+
+# phase, detector and lane configuration of each approach (see atspm/intersections.py)
+approaches = intersections.approaches(config_file, device)
+
+# stream parameters
+step = 1000 # stream time (ms) between chunks
+speed = None # stream time per wall-clock time: 1 for real time, None as fast as possible
+max_pending = 1000 # adv actuations pending per lane
+
+# =============================================================================
+# match events of each approach online
+# =============================================================================
+
+# count actuations replayed
+n_events = 0
+def countEvents(chunks):
+    global n_events
+    for df, watermark in chunks:
+        n_events += len(df)
+        yield df, watermark
+
+results, tick_time = [], []
+for approach, config in approaches.items():
+    approach_path = os.path.join(input_path, approach)
+    if not os.path.isdir(approach_path):
+        continue
+    
+    # proposed algorithm: adv actuations over the leftmost lane matched to left-turn rear det first (see match_events_bulk.py)
+    matcher = matchers.proposedMatcher(tt_thru_min, tt_thru_max, tt_thru_ideal_stop, tt_thru_ideal_run,
+                                       left = matchers.leftMatcher(tt_left_min, tt_left_max, tt_left_ideal,
+                                                                   lane = max(config['lane']['adv'].values())))
+    
+    # list of processed files, replayed as one stream
+    file_list = sorted(file for file in os.listdir(approach_path) if file.endswith("_filtered.npz"))
+    source = countEvents(online.replayFiles([os.path.join(approach_path, file) for file in file_list], step, speed))
+    
+    tic = time.time()
+    for matches, watermark, stats in online.matchStream(source, matcher, assign_method, max_pending):
+        tick_time.append(time.time() - tic)
+        if len(matches) > 0:
+            results.append(matches.assign(approach = approach))
+        tic = time.time()
+
+result = pd.concat(results, ignore_index = True) if len(results) > 0 else online.no_matches.assign(approach = '')
+result.to_csv(result_path, sep = '\t', index = False)
+
+# =============================================================================
+# throughput and latency
+# =============================================================================
+
+# processing time of chunks; stream latency of matches: watermark at finalization after adv actuation
+tick_time = np.array(tick_time)
+latency = (result.watermark.values - result.adv_ts.values).astype('float64') / 1000
+
+print("Matched", n_events, "actuations in", len(tick_time), "chunks in", round(tick_time.sum(), 2), "s")
+print("Throughput:", round(n_events / tick_time.sum()), "actuations/s,", round(len(tick_time) / tick_time.sum()), "chunks/s")
+print("Processing time of chunks (ms), p50, p95, max:", *np.round(np.percentile(tick_time, [50, 95, 100]) * 1000, 2))
+print("Matches: left", (result.stage == 'left').sum(), "thru", (result.stage == 'thru').sum())
+if len(latency) > 0:
+    print("Stream latency of matches (s), p50, p95, max:", *np.round(np.percentile(latency, [50, 95, 100]), 2))
@@ -1,8 +1,8 @@
 import os
+import sys
 import pandas as pd
 from datetime import datetime
 
-import plotly.express as px
 import plotly.io as pio
 pio.renderers.default = 'browser'
 
@@ -29,20 +29,42 @@ pio.renderers.default = 'browser'
 # df.to_csv(r"D:\GitHub\dilemma_zone\ignore\dz_data\dz_data.txt", sep = '\t', index = False)
 
 os.chdir(r"D:\GitHub\dilemma_zone")
-
-# read data
-df = pd.read_csv("ignore/dz_data/dz_data.txt", sep = '\t')
+sys.path.append(r"D:\GitHub\dilemma_zone\script")
+from atspm import store, compact, continuity, manifest, plots
+from atspm.timestamps import toDatetime
+
+# event store of hourly partitions
+store_path = "ignore/dz_data/store"
+device = 46
+
+# device shards of compact event records of month files (see merge_zipped_csv.py, mode = 'compact')
+events_path = r"D:\SynologyDrive\Data\High Resolution Events Data\Indian School"
+files = list([
+    '2023_01_ISR_19Ave',
+    '2023_02_ISR_19Ave',
+    '2023_03_ISR_19Ave',
+    '2023_04_ISR_19Ave',
+    '2023_05_ISR_19Ave'
+])
+
+# read data: open only the 19th Ave shard of each month file
+df = []
+for file in files:
+    events = compact.openShard(os.path.join(events_path, file + '_compact'), device)
+    df.append(compact.toFrame(events))
+df = pd.concat(df, ignore_index = True)
 df.drop('DeviceID', axis = 1, inplace = True)
-df.TimeStamp = pd.to_datetime(df.TimeStamp, format = '%m-%d-%Y %H:%M:%S.%f')
+
+# add month, day, hour
+dt = toDatetime(df.TimeStamp).dt
+df['month'] = dt.month
+df['day'] = dt.day
+df['hour'] = dt.hour
 
 # unique months in df
-months = list(df.TimeStamp.dt.month.unique())
+months = list(df.month.unique())
 months = months[1:] # remove December
-df = df[df.TimeStamp.dt.month.isin(months)] # update df for months
-
-# add month & day
-df['month'] = df.TimeStamp.dt.month
-df['day'] = df.TimeStamp.dt.day
+df = df[df.month.isin(months)] # update df for months
 
 # pairs of months and days
 days = {}
@@ -59,7 +81,10 @@ sig = [1, 8, 10]
 det = [9, 27, 10, 28, 11, 29, 5, 6]
 det_order = {'Parameter': det}
 
-# filter df for phase events
+# data continuity is checked by the continuity index below; html only for inspection
+write_html = False
+
+# filter df for phase events (timestamps in epoch milliseconds, binned for plotting)
 pdf = df.copy(deep = True)[(df.EventID.isin(sig) & (df.Parameter == phase))]
 pdf.Parameter = pdf.Parameter.astype(str)
 
@@ -67,8 +92,9 @@ pdf.Parameter = pdf.Parameter.astype(str)
 adf = df.copy(deep = True)[((df.EventID == on) & (df.Parameter.isin(det)))]
 adf.Parameter = adf.Parameter.astype(str)
 
-# write events to html file for each month-day pairs
-for key, value in days.items():
+# figures of events for each month-day pairs
+figures = {}
+for key, value in (days.items() if write_html else []):
     # filter signal & detection dfs for month
     month_sig_df = pdf[pdf.month == key]
     month_det_df = adf[adf.month == key]
@@ -78,40 +104,40 @@ for key, value in days.items():
         day_sig_df = month_sig_df[month_sig_df.day == val]
         day_det_df = month_det_df[month_det_df.day == val]
 
-        # plot data continuity for whole dataset
-        fig_sig = px.scatter(day_sig_df, x = 'TimeStamp', y = 'EventID')
-        fig_det = px.scatter(day_det_df, x = 'TimeStamp', y = 'Parameter', category_orders = det_order)
-        
+        # plot data continuity for whole day: per-channel time bins (see atspm/plots.py)
         file = '2023' + str(key).zfill(2) + str(val).zfill(2)
         output_sig = os.path.join("ignore/data_continuity_check", file + "_sig.html")
         output_det = os.path.join("ignore/data_continuity_check", file + "_det.html")
-        fig_sig.write_html(output_sig)
-        fig_det.write_html(output_det)
+        figures[output_sig] = plots.scatterEvents(day_sig_df, y = 'EventID')
+        figures[output_det] = plots.scatterEvents(day_det_df, y = 'Parameter', category_orders = det_order)
+
+# write html files headless in parallel
+plots.writeFigures(figures, num_workers = 8)
         
 # =============================================================================
 # create data set for January, February
 # =============================================================================
 
-for month in months[0:2]:
-    mdf = df.copy(deep = True)
-    mdf = mdf[mdf.month == month]
-    
-    for day in days[month]:
-        ddf = mdf.copy(deep = True)[mdf.day == day]
-        hours = list(ddf.TimeStamp.dt.hour.unique())
-        
-        for hour in hours:
-            hdf = ddf.copy(deep = True)[ddf.TimeStamp.dt.hour == hour]
-            
-            c1 = (hour == 2)
-            c2 = ((month == 1) & (day == 1) & (hour == 13))
-            c3 = ((month == 2) & (day == 17) & (hour == 11))
-            c4 = ((month == 2) & (day == 21) & (hour == 6))
-            
-            if (c1 | c2 | c3 | c4):
-                pass
-            else:
-                hdf.drop(['month', 'day'], axis = 1, inplace = True)
-                
-                file = '2023' + str(month).zfill(2) + str(day).zfill(2) + '_' + str(hour).zfill(2)
-                hdf.to_csv(os.path.join("ignore/dz_data/raw", file + "_raw.txt"), sep = '\t', index = False)
+# group events of January, February by (date, hour) once and write partitions in a thread pool
+# all hours are written: hours with errors are flagged by the continuity index below
+mdf = df[df.month.isin(months[0:2])]
+rows = store.writeHours(store_path, device, {col: mdf[col].values for col in store.cols}, num_workers = 8)
+print("Partitions written: ", len(rows), ", events: ", sum(rows.values()))
+
+# record partitions in manifest of store: rewritten partitions with unchanged content keep their checksum,
+# so outputs derived from them are not reprocessed by the bulk processors
+entries = manifest.readManifest(store_path)
+upstream = manifest.upstreamOf({file: manifest.fileChecksum(compact.shardPath(os.path.join(events_path, file + '_compact'), device)) for file in files})
+for path in rows.keys():
+    entries = manifest.recordPartition(entries, store_path, path, upstream)
+manifest.writeManifest(store_path, entries)
+
+# continuity index of partitions written: hours failing checks are skipped by the bulk processors
+# left-turn rear det (6) without events is not an error: no left turns in the hour
+index = continuity.buildIndex(store_path, device, [phase], det)
+flags = continuity.flagPartitions(index, silent = [6])
+print("Partitions failing continuity checks: ", list(flags[flags].index))
+
+# hours excluded by hand the checks do not flag: excludeHour is removed once this list is empty
+checks = continuity.flagPartitions(index, silent = [6], by_hand = False)
+print("Hours excluded by hand not flagged by the checks: ", [key for key in checks.index if continuity.excludeHour(*key) and not checks[key]])
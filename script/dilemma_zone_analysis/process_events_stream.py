@@ -0,0 +1,150 @@
+import os
+import sys
+import pandas as pd
+from collections import deque
+
+os.chdir(r"D:\GitHub\dilemma_zone")
+sys.path.append(r"D:\GitHub\dilemma_zone\script")
+from atspm import store, query, stream, cycles, process, continuity, intersections, frames
+from atspm.timestamps import ms_hour
+
+store_path = "ignore/dz_data/store"
+output_path = "ignore/dz_data/processed_stream" # outputs of each approach in <output_path>/<approach>
+config_file = "script/config/intersections.json"
+device = 46
+
+# =============================================================================
+# streaming alternative to process_events_bulk.py: consecutive hourly partitions
+# are processed as one event stream, so actuations at hour boundaries, the partial
+# cycles at the start and end of each hour are kept; outputs have the same format
+# =============================================================================
+
+# phase, detector and lane configuration of each approach (see atspm/intersections.py)
+approaches = intersections.approaches(config_file, device)
+on, off = stream.on, stream.off
+
+# threshold parameters
+crit_TUY_adv = 6 # critical TUY at adv det of YLR, RLR actuation over stop-bar det
+crit_AIY_adv = 3.6 # critical AIY at adv det = length of yellow interval
+crit_TUY_stop = 1.5 # critical TUY at stop bar det
+crit_AIY_stop = 12 # critical AIY at stop bar det
+
+crit = {'TUY_adv': crit_TUY_adv, 'AIY_adv': crit_AIY_adv,
+        'TUY_stop': crit_TUY_stop, 'AIY_stop': crit_AIY_stop}
+configs = {approach: dict(config, crit = crit) for approach, config in approaches.items()}
+
+# =============================================================================
+# events of an hour, read once for all approaches
+# =============================================================================
+
+# continuity index of hourly partitions, channels of all approaches (see atspm/continuity.py)
+index = continuity.buildIndex(store_path, device, intersections.thruPhases(configs), intersections.detectors(configs))
+
+# phase change and detection on/off events of channels of all approaches: each approach selects its own
+def readHour(date, hour):
+    return query.frame(query.hourEvents(store_path, device, date, hour, event_ids = list(cycles.start_events) + [on, off],
+                                        params = intersections.thruPhases(configs) + intersections.detectors(configs)))
+
+# =============================================================================
+# filter and write processed actuations of an hour
+# =============================================================================
+
+# filters as in process_events_bulk.py (see atspm/process.py)
+def writeHour(approach_path, file, mdf_thru, mdf_left, config):
+    mdf_thru = process.addLaneDet(mdf_thru, config)[process.thru_cols]
+    
+    fdf = process.filterEvents(mdf_thru, mdf_left, config)
+    frames.writeFrame(os.path.join(approach_path, file + "_filtered.npz"), fdf)
+    
+    return len(fdf)
+
+# =============================================================================
+# stream of an approach over a run of consecutive hours, fed one hour at a time
+# the stream takes the next hour from its queue and yields once per hour, and once at the end of the run
+# =============================================================================
+
+def openStream(approach, config):
+    queue = deque()
+    def chunks():
+        while queue[0] is not None:
+            yield queue.popleft()
+    
+    return {'approach': approach, 'config': config, 'queue': queue,
+            'actuations': stream.processStream(chunks(), config['phase']['thru'], process.thruDetectors(config)),
+            'files': {}, # file name of each hour start
+            'left_events': {}, # detection on the left-turn rear detector of each hour fed: {hour start: df}
+            'emitted': [], # actuations emitted, not yet written
+            'last': None} # start of last hour fed
+
+# write hours fed and complete: every actuation before end of hour emitted
+def writeComplete(run, actuations, watermark):
+    if len(actuations) > 0:
+        run['emitted'].append(actuations)
+    
+    complete = [start for start in run['left_events'] if start + ms_hour <= watermark]
+    if len(complete) == 0:
+        return None
+    
+    mdf = pd.concat(run['emitted'], ignore_index = True) if len(run['emitted']) > 0 else stream.emptyFrame()
+    hours = mdf.TimeStamp.astype('int64') // ms_hour * ms_hour
+    for start in sorted(complete):
+        rows = writeHour(os.path.join(output_path, run['approach']), run['files'][start],
+                         mdf[hours == start].sort_values(by = 'TimeStamp').reset_index(drop = True), run['left_events'].pop(start), run['config'])
+        print("Processed events for file:", run['approach'], run['files'][start], rows)
+    
+    run['emitted'] = [mdf[~hours.isin(complete)]]
+    return None
+
+def feedHour(run, date, hour, edf):
+    start = store.partitionStart(date, hour)
+    run['files'][start] = date + '_' + str(hour).zfill(2)
+    run['left_events'][start] = process.leftEvents(edf, run['config'])
+    run['last'] = start
+    
+    run['queue'].append(edf)
+    writeComplete(run, *next(run['actuations']))
+    return None
+
+def closeStream(run):
+    run['queue'].append(None)
+    writeComplete(run, *next(run['actuations']))
+    print("Processing events complete", run['approach'], "\n")
+    return None
+
+# =============================================================================
+# process events of each approach in one pass over the hours, each hour read once
+# =============================================================================
+
+# hourly partitions passing continuity checks of each approach
+# left-turn rear det without events is not an error: no left turns in the hour
+good = {}
+for approach, config in configs.items():
+    os.makedirs(os.path.join(output_path, approach), exist_ok = True)
+    det = config['det']
+    good[approach] = {(date, hour) for date, hour, partition in
+                      continuity.goodPartitions(store_path, device, index, [config['phase']['thru']],
+                                                process.thruDetectors(config) + (det['rear'],), silent = [det['rear']])}
+
+runs = {} # open stream of each approach
+for date, hour, partition in store.listPartitions(store_path, device):
+    approaches_hour = [approach for approach in configs if (date, hour) in good[approach]]
+    start = store.partitionStart(date, hour)
+    
+    # a run of an approach ends before an hour missing or failing its checks
+    for approach in list(runs):
+        if approach not in approaches_hour or runs[approach]['last'] + ms_hour != start:
+            closeStream(runs.pop(approach))
+    
+    if len(approaches_hour) == 0:
+        continue
+    
+    edf = readHour(date, hour)
+    for approach in approaches_hour:
+        if approach not in runs:
+            print("**************************************************")
+            print("Processing events of", approach, "from", date, hour, "\n")
+            runs[approach] = openStream(approach, configs[approach])
+        feedHour(runs[approach], date, hour, edf)
+
+for approach in list(runs):
+    closeStream(runs.pop(approach))
@@ -1,16 +1,23 @@
 import os
+import sys
 import json
 import pandas as pd
 
 os.chdir(r"D:\GitHub\dilemma_zone")
-input_path = "ignore/dz_data/processed"
+sys.path.append(r"D:\GitHub\dilemma_zone\script")
+from atspm import actuations, intersections
+
+input_path = "ignore/dz_data/processed" # processed events of each approach in <input_path>/<approach> (see process_events_bulk.py)
 output_path = "data/dz_analysis/"
+config_file = "script/config/intersections.json"
+device = 46
 
+# match results of each approach: {approach: {file: {stop id: adv id}}} (see match_events_bulk.py)
 with open('data/dz_analysis/match_results.txt') as f:
-    thru_pairs = json.load(f)
+    match_results = json.load(f)
     
-# list of processed files
-file_list = os.listdir(input_path)
+# approaches of the intersection (see atspm/intersections.py)
+approaches = intersections.approaches(config_file, device)
 
 def processMatchPairs():
 
@@ -23,9 +30,8 @@ def processMatchPairs():
         set_id_adv = set(pairs.values())
         set_id_stop = set(map(int, pairs.keys()))
         
-        # read data frame
-        df = pd.read_csv(os.path.join(input_path, file), sep = '\t')
-        df.TimeStamp = pd.to_datetime(df.TimeStamp, format = '%Y-%m-%d %H:%M:%S.%f')
+        # read data frame with coded columns (see atspm/actuations.py)
+        df = actuations.readActuations(os.path.join(approach_path, file))
         df.drop(['Parameter', 'Lane', 'Det', 'CycleNum', 'TUG', 'HeadwayLead', 'GapLead'], axis = 1, inplace = True)
         
         # data frame for advance, stop-bar det
@@ -45,7 +51,7 @@ def processMatchPairs():
             tdf.loc[i, 'ID_adv'] = value
             tdf.loc[i, 'ID_stop'] = key
             i += 1
-            
+        
         # convert id data type: object -> int
         tdf = tdf[['ID_adv', 'ID_stop']].astype(str).astype(int)
         
@@ -53,7 +59,7 @@ def processMatchPairs():
         mdf = mdf.merge(sdf, how = 'outer') # merge sdf
         
         # compute travel time based on timestamps
-        mdf['travel_time'] = round((mdf.TimeStamp_stop - mdf.TimeStamp_adv).dt.total_seconds(), 1)
+        mdf['travel_time'] = round((mdf.TimeStamp_stop - mdf.TimeStamp_adv) / 1000, 1)
         
         # indication at adv detector
         mdf.loc[mdf.SCA_adv.isin(['YY', 'YR']), 'adv_indication'] = 0 # yellow
@@ -81,15 +87,36 @@ def processMatchPairs():
         mdf['month'] = month
         mdf['day'] = day
         mdf['hour'] = hour
+        mdf['approach'] = approach
         
         return mdf
 
-# create full data frame for all processed files
+# create full data frame for all processed files of each approach
 fdf = []
-for file in file_list:
-    print("Processing file: ", file)    
-    fdf.append(processMatchPairs())
+for approach in approaches:
+    approach_path = os.path.join(input_path, approach)
+    if not os.path.isdir(approach_path):
+        continue
+    
+    # list of processed files and their match results; files without match results are skipped (run match_events_bulk.py)
+    file_list = sorted(file for file in os.listdir(approach_path) if file.endswith("_filtered.npz"))
+    thru_pairs = match_results.get(approach, {})
+    
+    missing = [file for file in file_list if file not in thru_pairs]
+    if len(missing) > 0:
+        print("No match results of approach", approach, "for", len(missing), "of", len(file_list), "files")
+    
+    for file in file_list:
+        if file in missing:
+            continue
+        
+        print("Processing file: ", approach, file)    
+        fdf.append(processMatchPairs())
 
-# merge data frames
-fdf = pd.concat(fdf)
-fdf.to_csv(os.path.join(output_path, "matched_events_dataset_bulk.txt"), sep = '\t', index = False)
+# merge data frames; files without matches have none
+fdf = [mdf for mdf in fdf if mdf is not None]
+if len(fdf) == 0:
+    print("No matched events of processed files")
+else:
+    fdf = pd.concat(fdf)
+    fdf.to_csv(os.path.join(output_path, "matched_events_dataset_bulk.txt"), sep = '\t', index = False)
@@ -0,0 +1,95 @@
+# =============================================================================
+# side-by-side performance of the proposed, Ding's and Lu's algorithms
+# calibration files are read once and matched by each algorithm and assignment method
+# =============================================================================
+
+import os
+import sys
+import time
+
+os.chdir(r"D:\GitHub\dilemma_zone")
+sys.path.append(r"D:\GitHub\dilemma_zone\script")
+from atspm import actuations, matchers
+
+# =============================================================================
+# files & parameters
+# =============================================================================
+
+# select period and file
+def getFileName(year, month, day, from_hour, from_min, to_hour, to_min):
+    return(str(year) + str(month).zfill(2) + str(day).zfill(2) + '_' +
+           str(from_hour).zfill(2) + str(from_min).zfill(2) + '_' +
+           str(to_hour).zfill(2) + str(to_min).zfill(2))
+
+path = "ignore/calibration_data"
+files = list([getFileName(2022, 12, 6, 7, 45, 8, 15),
+              getFileName(2022, 12, 6, 8, 45, 9, 15),
+              getFileName(2022, 12, 14, 7, 45, 8, 15),
+              getFileName(2022, 12, 14, 8, 45, 9, 15),
+              getFileName(2022, 12, 14, 9, 45, 10, 15),
+              getFileName(2023, 3, 27, 14, 15, 18, 45)])
+
+# read results of video-verified matches
+left_result = matchers.readVerified('data/calibration/manual_adv_left_pairs.txt')
+thru_result = matchers.readVerified('data/calibration/manual_adv_stop_pairs.txt')
+
+comparison_file = "data/calibration/algorithm_comparison.txt"
+
+# detector length & spacing parameters
+len_stop = 40 # length of stop-bar det
+len_adv = 5 # length of advance det
+dist_det = 300 # end-end distance between stop-bar and advance det
+dist_adv_stop = dist_det - len_stop
+
+# vehicle length parameters (Ding's and Lu's algorithms)
+veh_length = 22
+eff_length_adv = len_adv + veh_length
+eff_length_stop = len_stop + veh_length
+
+# other parameters
+acc_max = 6
+
+# empirical min, max of through travel time
+tt_thru_min = 3
+tt_thru_max = 11
+
+# empirical travel time to stop/run over stop-bar det
+tt_thru_ideal_stop = 6.6
+tt_thru_ideal_run = 4.6
+
+# empirical min, max, ideal left-turn travel time (from adv det to left-turn lane rear det)
+tt_left_min = 4
+tt_left_max = 7
+tt_left_ideal = 5.4
+
+# algorithms and assignment methods of candidate pairs to compare (see atspm/matchers.py, atspm/matching.py)
+algorithms = {'proposed': matchers.proposedMatcher(tt_thru_min, tt_thru_max, tt_thru_ideal_stop, tt_thru_ideal_run,
+                                                   left = matchers.leftMatcher(tt_left_min, tt_left_max, tt_left_ideal, lane = 2)),
+              'Ding': matchers.dingMatcher(eff_length_adv, eff_length_stop, dist_adv_stop, acc_max),
+              'Lu': matchers.luMatcher(eff_length_adv, eff_length_stop, dist_adv_stop)}
+assign_methods = ['sequential', 'greedy', 'optimal']
+
+# =============================================================================
+# thru performance of each algorithm and assignment method
+# =============================================================================
+
+# data frames of files, read once for all algorithms
+dfs = [actuations.readActuations(os.path.join(path, file + '_filtered.npz')) for file in files]
+
+rows = []
+for method in assign_methods:
+    tic = time.time()
+    comparison = matchers.compare(dfs, algorithms, left_result, thru_result, method)
+    print("Matched files with", method, "assignment in", round(time.time() - tic, 2), "s")
+    
+    for name, evaluations in comparison.items():
+        counts = [evaluation['thru'] for evaluation in evaluations]
+        total, value = matchers.totals(counts), matchers.accuracy(counts)
+        print(name, method, "TP, FP, FN, TN: ", total['TP'], total['FP'], total['FN'], total['TN'], value)
+        rows.append([name, method, total['TP'], total['FP'], total['FN'], total['TN'],
+                     value['precision'], value['recall'], value['f1_score']])
+
+with open(comparison_file, 'w') as f:
+    f.write("algorithm\tmethod\tTP\tFP\tFN\tTN\tprecision\trecall\tf1_score\n")
+    for row in rows:
+        f.write("\t".join(str(x) for x in row) + "\n")
@@ -1,7 +1,12 @@
 import os
+import sys
 import pandas as pd
 from datetime import datetime
 
+sys.path.append(r"D:\GitHub\dilemma_zone\script")
+from atspm import query
+from atspm.timestamps import parseTimeStamp, toDatetime
+
 import plotly.express as px
 import plotly.io as pio
 pio.renderers.default = 'browser'
@@ -17,7 +22,8 @@ df = pd.read_csv(file + "_raw.txt", sep = '\t')
 ID = 46
 df = df[df.DeviceID == ID]
 df.drop('DeviceID', axis = 1, inplace = True)
-df.TimeStamp = pd.to_datetime(df.TimeStamp, format = '%m-%d-%Y %H:%M:%S.%f')
+df.TimeStamp = parseTimeStamp(df.TimeStamp) # epoch milliseconds, parsed once
+df = df.sort_values(by = 'TimeStamp', kind = 'stable', ignore_index = True) # sorted for time-range windows
 
 # detector configuration for wb
 det = {'adv': (27, 28, 29), 
@@ -29,6 +35,7 @@ det_set = det['adv'] + det['stop'] + det['left']
 fdf = df.copy(deep = True)
 fdf = fdf.loc[(df.EventID == 82) & (df.Parameter.isin(det_set))]
 fdf.Parameter = fdf.Parameter.astype(str)
+fdf.TimeStamp = toDatetime(fdf.TimeStamp)
 
 # plot data continuity for whole dataset
 det_order = {'Parameter': sorted(det)}
@@ -44,7 +51,7 @@ fig.write_html(output_fig)
 # filter timestamp for data subset
 start = datetime(year, month, day, 9, 45)
 end = datetime(year, month, day, 10, 15)
-sdf = df[(df.TimeStamp >= start) & (df.TimeStamp <= end)]
+sdf = query.window(df, start, end)
 
 output_period = str(start.hour).zfill(2) + str(start.minute).zfill(2) + '_' + str(end.hour).zfill(2) + str(end.minute).zfill(2)
 
@@ -1,25 +1,17 @@
 import os
-import pandas as pd
+import sys
 import ast
 
 os.chdir(r"D:\GitHub\dilemma_zone")
-
-# define class to subtract timestamps
-class Vector():
-    def __init__(self, data):
-        self.data = data
-    def __repr__(self):
-        return repr(self.data)
-    def __sub__(self, other):
-        return list((a-b).total_seconds() for a, b in zip(self.data, other.data))
+sys.path.append(r"D:\GitHub\dilemma_zone\script")
+from atspm import intervals, actuations
 
 path = "ignore\calibration_data"
 
 # select period and file
 def getFileDataSet(year, month, day, from_hour, from_min, to_hour, to_min):
     file = str(year) + str(month).zfill(2) + str(day).zfill(2) + '_' + str(from_hour).zfill(2) + str(from_min).zfill(2) + '_' + str(to_hour).zfill(2) + str(to_min).zfill(2)
-    df = pd.read_csv(os.path.join(path, file + '_filtered.txt'), sep = '\t')
-    df.TimeStamp = pd.to_datetime(df.TimeStamp, format = '%Y-%m-%d %H:%M:%S.%f').sort_values()
+    df = actuations.readActuations(os.path.join(path, file + '_filtered.npz'))
     return df
 
 df1 = getFileDataSet(2022, 12, 6, 7, 45, 8, 15)
@@ -67,7 +59,7 @@ for key, value in left_result.items():
             adv_time = xdf[xdf.ID == inner_key].TimeStamp
             left_time = xdf[xdf.ID == inner_value].TimeStamp
             
-            diff = (Vector(left_time) - Vector(adv_time)).pop()
+            diff = float(intervals.seconds(left_time, adv_time)[-1])
             travel_time.append(diff)
             
             file_left.write(str(diff)+"\n")
@@ -101,7 +93,7 @@ for key, value in thru_result.items():
         adv_time = xdf[xdf.ID == inner_value].TimeStamp
         thru_time = xdf[xdf.ID == inner_key].TimeStamp
         
-        diff = (Vector(thru_time) - Vector(adv_time)).pop()
+        diff = float(intervals.seconds(thru_time, adv_time)[-1])
         travel_time.append(diff)
         
         SCA = xdf[xdf.ID == inner_key].SCA.values[0] # signal change at stop-bar
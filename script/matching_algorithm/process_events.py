@@ -1,21 +1,14 @@
 import os
+import sys
 import pandas as pd
-import numpy as np
 
-import plotly.express as px
 import plotly.io as pio
 pio.renderers.default = 'browser'
 
 os.chdir(r"D:\GitHub\dilemma_zone")
-
-# define class to subtract timestamps
-class Vector():
-    def __init__(self, data):
-        self.data = data
-    def __repr__(self):
-        return repr(self.data)
-    def __sub__(self, other):
-        return list((a-b).total_seconds() for a, b in zip(self.data, other.data))
+sys.path.append(r"D:\GitHub\dilemma_zone\script")
+from atspm import query, plots, actuations, cycles, frames
+from atspm.timestamps import parseTimeStamp
 
 # select period and file
 def getFileName(year, month, day, from_hour, from_min, to_hour, to_min):
@@ -23,12 +16,14 @@ def getFileName(year, month, day, from_hour, from_min, to_hour, to_min):
            str(from_hour).zfill(2) + str(from_min).zfill(2) + '_' +
            str(to_hour).zfill(2) + str(to_min).zfill(2))
 
-# read file, convert timestamp
+# read file (timestamps in epoch milliseconds, parsed if text), sorted for time-range windows
 file = getFileName(2023, 3, 27, 14, 15, 18, 45)
 path = "ignore\calibration_data"
 
 df = pd.read_csv(os.path.join(path, file + '.txt'), sep = '\t')
-df.TimeStamp = pd.to_datetime(df.TimeStamp, format = '%Y-%m-%d %H:%M:%S.%f').sort_values()
+if df.TimeStamp.dtype == object:
+    df.TimeStamp = parseTimeStamp(df.TimeStamp) # files written before timestamps were stored as epoch milliseconds
+df = df.sort_values(by = 'TimeStamp', kind = 'stable', ignore_index = True)
 
 # =============================================================================
 # phase & detector configuration for westbound
@@ -41,7 +36,6 @@ phase = {'thru': 2, 'left': 5}
 pse = {'Gs': 1, 'Ge': 7,
        'Ys': 8, 'Ye': 9,
        'Rs': 10, 'Re': 11}
-signal = {8: 'Y', 10: 'R', 1: 'G'}
 
 # detector configuration
 on, off = 82, 81
@@ -60,52 +54,16 @@ lane = {'adv': {27: 0, 28: 1, 29: 2},
 # process phase change events
 # =============================================================================
 
+# cycle tables of phase directions, computed once per file (see atspm/cycles.py)
+cycle_tables = {}
+
 def processPhaseChanges(phase_dirc):
-    # phase change events data frame
-    pdf = df.copy(deep = True)
-    
-    # filter phase direction and phase events
-    pdf = pdf[(pdf.Parameter == phase[phase_dirc]) & (pdf.EventID.isin(list(pse.values())))]
-    
-    # compute cycle time range assuming cycle starts on yellow
-    cycle_range = {'min': min((pdf.loc[pdf.EventID == pse['Ge']]).TimeStamp),
-                   'max': max((pdf.loc[pdf.EventID == pse['Ge']]).TimeStamp)}
-    
-    pdf = pdf[(pdf.TimeStamp >= cycle_range['min']) & (pdf.TimeStamp <= cycle_range['max'])]
-    pdf = pdf[pdf.EventID.isin((pse['Ys'], pse['Rs'], pse['Gs']))]
-    
-    # indication start times: yellow, red, green
-    start_time = {'Y': tuple((pdf.loc[pdf.EventID == pse['Ys']]).TimeStamp),
-                  'R': tuple((pdf.loc[pdf.EventID == pse['Rs']]).TimeStamp),
-                  'G': tuple((pdf.loc[pdf.EventID == pse['Gs']]).TimeStamp)}
-    
-    # indication time intervals: yellow, red, green
-    interval = {'Y': Vector(start_time['R']) - Vector(start_time['Y'][:-1]),
-                'R': Vector(start_time['G']) - Vector(start_time['R']),
-                'G': Vector(start_time['Y'][1:]) - Vector(start_time['G'])}
+    if phase_dirc not in cycle_tables:
+        # filter phase direction and phase events
+        pdf = df[(df.Parameter == phase[phase_dirc]) & (df.EventID.isin(list(pse.values())))]
+        cycle_tables[phase_dirc] = cycles.fromEvents(pdf)
     
-    # cycle number and length
-    cycle_index = {'num': tuple(range(1, len(start_time['Y']))),
-                   'length': Vector(start_time['Y'][1:]) - Vector(start_time['Y'][:-1])}
-    
-    cycle = {
-        'CycleNum': cycle_index['num'],
-        'CycleLength': cycle_index['length'],
-        'YST': start_time['Y'][:-1], # current cycle
-        'RST': start_time['R'],
-        'GST': start_time['G'],
-        'YST_NC': start_time['Y'][1:], # next cycle
-        'YellowTime': interval['Y'],
-        'RedTime': interval['R'],
-        'GreenTime': interval['G']
-    }
-    
-    cdf = pd.DataFrame(cycle)
-    
-    return {'pdf': pdf, # phase data frame
-            'cdf': cdf, # cycle data frame
-            'start_time': start_time,
-            'cycle_range': cycle_range}
+    return cycle_tables[phase_dirc]
 
 # =============================================================================
 # process detector actuation events
@@ -120,7 +78,7 @@ def processDetectorActuations(phase_dirc):
     
     # filter detection events within cycle min-max time (exclude bounds)
     cycle_range = processPhaseChanges(phase_dirc)['cycle_range']
-    ddf = ddf[(ddf.TimeStamp > cycle_range['min']) & (ddf.TimeStamp < cycle_range['max'])]
+    ddf = query.window(ddf, cycle_range['min'], cycle_range['max'], closed = 'neither')
     
     # filter detector number; add lane position and detector type
     if phase_dirc == 'thru':
@@ -139,65 +97,6 @@ def processDetectorActuations(phase_dirc):
     return {'ddf': ddf, 
             'det_set': det_set}
 
-# =============================================================================
-# process signal change during actuation and OHG parameters
-# =============================================================================
-
-# signal change during actuation (SCA)
-# first on and last off (FOLO) over a detector
-# computation of parameters: occupancy time, headway, gap
-def processSCA_OHG(xdf, det_num):
-    print("Checking signal change during actuation for detector: ", det_num)
-    ldf = xdf.copy(deep = True) # lane-based actuations events df
-    ldf = ldf[ldf.Parameter == det_num] # filter for detector number
-    
-    # timestamps of detector on and off
-    detOn = tuple((ldf.loc[ldf.EventID == on]).TimeStamp)
-    detOff = tuple((ldf.loc[ldf.EventID == off]).TimeStamp)
-    
-    # filter df for timestamp between first det on and last det off
-    detOnFirst, detOffLast = min(detOn), max(detOff)
-    ldf = ldf[(ldf.TimeStamp >= detOnFirst) & (ldf.TimeStamp <= detOffLast)]
-    
-    # check number of on/off actutations are equal
-    lenDetOn = len(ldf.loc[ldf.EventID == on])
-    lenDetOff = len(ldf.loc[ldf.EventID == off])
-    
-    if lenDetOn != lenDetOff:
-        print("Error!")
-        return None
-    else:
-        print("Pass!")
-        # get signal status for detector on and off
-        detOnSignal = tuple((ldf.loc[ldf.EventID == on]).Signal)
-        detOffSignal = tuple((ldf.loc[ldf.EventID == off]).Signal)
-        
-        # filtered timestamps of detector on and off
-        detOnTime = tuple((ldf.loc[ldf.EventID == on]).TimeStamp)
-        detOffTime = tuple((ldf.loc[ldf.EventID == off]).TimeStamp)
-        
-        # compute on-detector time
-        OccTime = np.array(Vector(detOffTime) - Vector(detOnTime))
-        
-        # compute leading and following headway
-        Headway = np.array(Vector(detOnTime[1:]) - Vector(detOnTime))
-        HeadwayLead = np.append(Headway, np.nan)
-        HeadwayFoll = np.insert(Headway, 0, np.nan)
-        
-        # compute leading and following gap
-        Gap = np.array(Vector(detOnTime[1:]) - Vector(detOffTime))
-        GapLead = np.append(Gap, np.nan)
-        GapFoll = np.insert(Gap, 0, np.nan)
-        
-        return {'dof': detOnFirst,
-                'dol': detOffLast,
-                'SCA': [i + j for i, j in zip(detOnSignal, detOffSignal)],
-                'OccTime': OccTime,
-                'HeadwayLead': HeadwayLead,
-                'HeadwayFoll': HeadwayFoll,
-                'GapLead': GapLead,
-                'GapFoll': GapFoll}
-    
 # =============================================================================
 # merge events and compute parameters
 # =============================================================================
@@ -205,9 +104,9 @@ def processSCA_OHG(xdf, det_num):
 def processMergedEvents(phase_dirc):
     
     # check phase parameters
-    pdf = processPhaseChanges(phase_dirc)['pdf']
-    cdf = processPhaseChanges(phase_dirc)['cdf']
-    start_time = processPhaseChanges(phase_dirc)['start_time']
+    phase_changes = processPhaseChanges(phase_dirc)
+    cdf = phase_changes['cdf']
+    start_time = phase_changes['start_time']
     
     print("Yellows, Reds, Greens:", 
           len(start_time['Y']), 
@@ -221,71 +120,45 @@ def processMergedEvents(phase_dirc):
     print("Green time:", min(cdf['GreenTime']), max(cdf['GreenTime']), "\n")
     
     # check detector parameters
-    ddf = processDetectorActuations(phase_dirc)['ddf']
-    det_set = processDetectorActuations(phase_dirc)['det_set']
+    det_actuations = processDetectorActuations(phase_dirc)
+    ddf = det_actuations['ddf']
+    det_set = det_actuations['det_set']
 
     print("Lane-by-lane detector actuations:")
     print(ddf.Parameter.value_counts(dropna = False).sort_values(), "\n")
     print(ddf.groupby('Parameter').EventID.value_counts(), "\n")
     
-    # merge events data sets
-    mdf = pd.concat([pdf, ddf]).sort_values(by = 'TimeStamp')
-    mdf = mdf[:-1] # end row is yellow start time of new cycle
-
-    # add signal category
-    mdf['Signal'] = mdf.EventID.map(signal)
-    mdf.Signal.ffill(inplace = True)
+    # signal indication, cycle and phase parameters at each on/off actuation (see atspm/cycles.py)
+    state = cycles.asOf(phase_changes, ddf.TimeStamp.values)
     
-    # add cycle number
-    mdf.loc[mdf.EventID == pse['Ys'], 'CycleNum'] = list(range(1, len(start_time['Y'])))
-    mdf.CycleNum.ffill(inplace = True)
+    # signal change during actuation (SCA) and OHG parameters of all detectors in one pass
+    # on/off paired over each detector, orphan on/off events dropped; parameters of detection on events
+    sca_ohg = actuations.scaOHG(ddf.TimeStamp.values, ddf.EventID.values, ddf.Parameter.values, state['Signal'], det_set)
     
-    # left join merged and cycle data frames
-    mdf = mdf.merge(cdf, how = 'left', on = 'CycleNum')
+    mdf = ddf.assign(CycleNum = state['CycleNum'], AIY = state['AIY'], TUY = state['TUY'], TUG = state['TUG'],
+                     **actuations.toColumns(sca_ohg, len(ddf)))
     
-    # phase & detection parameters
-    mdf['AIY'] = round((mdf.TimeStamp - mdf.YST).dt.total_seconds(), 1) # arrival in yellow
-    mdf['TUY'] = round((mdf.YST_NC - mdf.TimeStamp).dt.total_seconds(), 1) # time until yellow
-    mdf['TUG'] = round((mdf.GST - mdf.TimeStamp).dt.total_seconds(), 1) # time until green
-
-    # signal change during actuation for each detector
-    for det_num in det_set:
-        sca_ohg = processSCA_OHG(mdf, det_num)
-        
-        timestamp_limit = (mdf.TimeStamp >= sca_ohg['dof']) & (mdf.TimeStamp <= sca_ohg['dol'])
-        cols = ['SCA', 'OccTime', 'HeadwayLead', 'HeadwayFoll', 'GapLead', 'GapFoll']
-        
-        for col in cols:
-            mdf.loc[(mdf.EventID == on) & (mdf.Parameter == det_num) & timestamp_limit, col] = sca_ohg[col]
-        print("SCA check complete!", "\n")
-        
     # keep events with detection on
-    mdf = mdf[mdf.EventID == on]
-    
-    # drop columns
-    drop_cols = ['EventID', 'Signal', 'CycleLength', 'YellowTime', 'RedTime', 'GreenTime', 'YST', 'RST', 'GST', 'YST_NC']
-    mdf.drop(drop_cols, axis = 1, inplace = True)
+    mdf = mdf[mdf.EventID == on].drop('EventID', axis = 1)
     
     # drop rows with SCA == Nan
     mdf.dropna(subset = ['SCA'], axis = 0, inplace = True)
     
-    # convert parameter to character (for plotting)
-    mdf.Parameter = mdf.Parameter.astype(str)
-
-    return mdf
+    # integer and categorical codes of detector, lane and SCA; labels for plotting only
+    return actuations.compact(mdf)
 
 mdf_thru = processMergedEvents('thru')
 mdf_left = processMergedEvents('left')
 
 # merged data set for thru + left-turn
-mdf = pd.concat([mdf_thru, mdf_left]).sort_values(by = 'TimeStamp')
+mdf = actuations.compact(pd.concat([mdf_thru, mdf_left]).sort_values(by = 'TimeStamp'))
 mdf.reset_index(drop = True, inplace = True)
 
 cdf = processPhaseChanges('thru')['cdf']
 
-# save data sets
-mdf.to_csv(os.path.join(path, file + "_processed.txt"), sep = '\t', index = False)
-cdf.to_csv(os.path.join(path, file + "_cycle.txt"), sep = '\t', index = False)
+# save data sets as typed binary frames (see atspm/frames.py)
+frames.writeFrame(os.path.join(path, file + "_processed.npz"), mdf)
+frames.writeFrame(os.path.join(path, file + "_cycle.npz"), cdf)
 
 # =============================================================================
 # visualize actuation with signal change
@@ -309,21 +182,24 @@ sca_color = {'YY': 'orange',
              'GY': 'limegreen',
              'GR': 'navy'}
 
-def plotActuationSCA(xdf):
-    fig = px.scatter(
-        xdf, x = 'TimeStamp', y = 'Parameter',
+# binned over long windows, raw points with hover details over short windows (see atspm/plots.py)
+def plotActuationSCA(xdf, show = False):
+    fig = plots.scatterEvents(
+        actuations.labels(xdf), y = 'Parameter',
         color = 'SCA',
         hover_name = 'ID',
         hover_data = ['AIY', 'TUY', 'TUG', 'OccTime', 'HeadwayLead', 'GapLead'],
         category_orders = cat_order,
         color_discrete_map = sca_color
-    ).update_traces(marker = dict(size = 10))
+    )
     
-    fig.show()
+    if show:
+        fig.show()
     return fig
-    
-fig = plotActuationSCA(mdf)
-fig.write_html(os.path.join("ignore/calibration_actuation_html", file + "_processed.html"))
+
+# figures are written headless at the end
+figures = {}
+figures[os.path.join("ignore/calibration_actuation_html", file + "_processed.html")] = plotActuationSCA(mdf)
 
 # =============================================================================
 # filter actuation at onset of yellow
@@ -354,7 +230,9 @@ id_adv_stop = sorted(set.union(id_adv, id_stop))
 
 # filtered data frame
 fdf = tdf[(tdf.Lane == -1) | (tdf.ID.isin(id_adv_stop))]
-fdf.to_csv(os.path.join(path, file + "_filtered.txt"), sep = '\t', index = False)
+frames.writeFrame(os.path.join(path, file + "_filtered.npz"), fdf)
+
+figures[os.path.join("ignore/calibration_actuation_html", file + "_filtered.html")] = plotActuationSCA(fdf)
 
-fig = plotActuationSCA(fdf)
-fig.write_html(os.path.join("ignore/calibration_actuation_html", file + "_filtered.html"))
+# write figures in parallel
+plots.writeFigures(figures)
@@ -1,8 +1,11 @@
 import os
+import sys
 import ast
 import pandas as pd
 
 os.chdir(r"D:\GitHub\dilemma_zone")
+sys.path.append(r"D:\GitHub\dilemma_zone\script")
+from atspm import actuations
 
 with open('data/calibration/manual_adv_stop_pairs.txt') as f:
     thru_pairs = ast.literal_eval(f.read())
@@ -35,8 +38,7 @@ def processMatchPairs(file_num):
     set_id_stop = set(pairs.keys())
     
     # read data frame
-    df = pd.read_csv(os.path.join(input_path, files[file_num] + '_filtered.txt'), sep = '\t')
-    df.TimeStamp = pd.to_datetime(df.TimeStamp, format = '%Y-%m-%d %H:%M:%S.%f')
+    df = actuations.readActuations(os.path.join(input_path, files[file_num] + '_filtered.npz'))
     df.drop(['Parameter', 'Lane', 'Det', 'CycleNum', 'TUG', 'HeadwayLead', 'GapLead'], axis = 1, inplace = True)
     
     # data frame for advance, stop-bar det
@@ -61,7 +63,7 @@ def processMatchPairs(file_num):
     mdf = mdf.merge(sdf, how = 'outer') # merge sdf
     
     # compute travel time based on timestamps
-    mdf['travel_time'] = round((mdf.TimeStamp_stop - mdf.TimeStamp_adv).dt.total_seconds(), 1)
+    mdf['travel_time'] = round((mdf.TimeStamp_stop - mdf.TimeStamp_adv) / 1000, 1)
     
     # indication at adv detector
     mdf.loc[mdf.SCA_adv.isin(['YY', 'YR']), 'adv_indication'] = 0 # yellow
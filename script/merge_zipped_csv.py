@@ -1,7 +1,11 @@
 import os
+import sys
 import zipfile
 import pandas as pd
 
+sys.path.append(r"D:\GitHub\dilemma_zone\script")
+from atspm import ingest
+
 os.chdir(r"D:\SynologyDrive\Data\High Resolution Events Data\Indian School")
 
 folder_name = '2023_05_ISR_19Ave'
@@ -11,19 +15,40 @@ device_list = []
 for file in file_list:
     device_list.append(file[5:7])
 
+# output mode: 'txt' (single tab-separated file), 'store' (device/date/hour partitioned event store)
+# or 'compact' (mmap-able 12-byte event records, one shard per device)
+mode = 'store'
+store_path = 'event_store'
+compact_path = folder_name + '_compact'
+num_workers = 8
+
 cols = ['TimeStamp', 'EventID', 'Parameter']
-df = []
-i = 0
 
-for file in file_list:
-    if file.endswith('.zip'):
-        zip_file = os.path.join(folder_name, file)
-        zf = zipfile.ZipFile(zip_file)
-        temp = pd.read_csv(zf.open(zf.namelist()[0]), names = cols)
-        temp['DeviceID'] = device_list[i]
-        df += [temp]
-    i += 1
-        
-output_path = folder_name + '.txt'
-
-pd.concat(df, ignore_index = True).to_csv(output_path, index = False, sep = '\t')
+if mode == 'txt':
+    df = []
+    i = 0
+
+    for file in file_list:
+        if file.endswith('.zip'):
+            zip_file = os.path.join(folder_name, file)
+            zf = zipfile.ZipFile(zip_file)
+            temp = pd.read_csv(zf.open(zf.namelist()[0]), names = cols)
+            temp['DeviceID'] = device_list[i]
+            df += [temp]
+        i += 1
+
+    output_path = folder_name + '.txt'
+
+    pd.concat(df, ignore_index = True).to_csv(output_path, index = False, sep = '\t')
+
+# one worker per device shard; each worker reads its zip files one chunk at a time
+if mode in ['store', 'compact'] and __name__ == '__main__':
+    zip_files = [os.path.join(folder_name, file) for file in file_list if file.endswith('.zip')]
+    devices = [int(file[5:7]) for file in file_list if file.endswith('.zip')]
+
+    if mode == 'store':
+        rows = ingest.ingestZipFiles(zip_files, devices, store_path, num_workers = num_workers)
+        print("Partitions written: ", len(rows), ", events: ", sum(rows.values()))
+    else:
+        rows = ingest.compactZipFiles(zip_files, devices, compact_path, num_workers = num_workers)
+        print("Device shards written: ", len(rows), ", events: ", sum(rows.values()))